@@ -20,6 +20,79 @@ API_PREFIX = "/api"
 # Cache Settings
 CACHE_ENABLED = True
 CACHE_TIMEOUT = 3600  # 1 hour
+# Disk cache writes are committed in batches, at most this long after they are made
+DISK_CACHE_FLUSH_INTERVAL = 0.05  # seconds
+GEOCODE_CACHE_SIZE = 2048
+GEOCODE_CACHE_TTL = 30 * 24 * 3600  # 30 days on disk, city coordinates rarely change
+GEOCODE_NEGATIVE_TTL = 300  # 5 minutes for locations Google could not resolve
+PLACE_DETAILS_CACHE_SIZE = 4096
+PLACE_DETAILS_CACHE_TTL = 24 * 3600  # 1 day
+PLAN_CACHE_SIZE = 512
+# Destination overviews and practical info, shared by every trip to a destination in a month
+DESTINATION_GUIDE_CACHE_SIZE = 1024
+DESTINATION_GUIDE_TTL = 30 * 24 * 3600  # 30 days
+# How long past CACHE_TIMEOUT a trip plan may be served while it is refreshed
+PLAN_CACHE_STALE_TTL = 24 * 3600  # 1 day
+
+# Places nearby searches are cached by geohash cell and shared between nearby points
+NEARBY_CACHE_PRECISION = 6  # geohash characters; cells of about 1.2 x 0.6 km
+NEARBY_CACHE_TTL = 24 * 3600  # 1 day per cell
+NEARBY_CACHE_MAX_CELLS = 200000
+# Fraction of a search circle's cells that must be cached to answer it without Google
+NEARBY_CACHE_MIN_COVERAGE = 0.8
+
+# Outbound HTTP
+# One pooled aiohttp session is shared by all upstream calls
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+# Keep-alive connections held open to a single upstream host
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "32"))
+HTTP_DNS_CACHE_TTL = 300  # seconds
+HTTP_KEEPALIVE_TIMEOUT = 30  # seconds an idle connection stays open
+HTTP_CONNECT_TIMEOUT = 3.0  # seconds
+HTTP_READ_TIMEOUT = 10.0  # seconds
+# Extra attempts for connection errors and 5xx responses
+HTTP_MAX_RETRIES = 1
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+MAPS_READ_TIMEOUT = 5.0  # seconds
+
+# Concurrency Settings
+# How long get_hotels waits for place details before returning partial results
+HOTEL_DETAILS_DEADLINE = 2.5  # seconds
+# Default number of Gemini generations a batch runs at once
+BATCH_GEMINI_CONCURRENCY = int(os.getenv("BATCH_GEMINI_CONCURRENCY", "4"))
+
+# Long Trips
+# Itineraries of at least this many days are generated as an outline, then blocks of days in parallel
+CHUNKED_ITINERARY_MIN_DAYS = 10
+# Smallest block; blocks are larger when the Gemini burst allows fewer parallel calls
+ITINERARY_BLOCK_DAYS = 5
+# Output token budgets: per day of an itinerary block, and per block line of the outline
+ITINERARY_TOKENS_PER_DAY = 600
+OUTLINE_TOKENS_PER_BLOCK = 80
+
+# Deadlines and Hedging
+# Latency budget for a /api/plan-trip request; sections not ready in time are left out
+PLAN_TRIP_DEADLINE = float(os.getenv("PLAN_TRIP_DEADLINE", "30"))  # seconds
+# Budgets for the Maps stages of a plan, within the request deadline. Gemini gets whatever is left.
+STAGE_BUDGETS = {
+    "geocoding": 3.0,
+    "hotels": 8.0,
+    "photos": 6.0
+}
+GEMINI_TIMEOUT = 45.0  # seconds per generation
+# Longest gap between chunks of a streamed generation
+GEMINI_STREAM_IDLE_TIMEOUT = 20.0  # seconds
+# Per Maps call, including quota wait and retries
+MAPS_CALL_TIMEOUT = 8.0  # seconds
+# Idempotent Maps reads are duplicated once they have taken longer than this quantile of recent calls
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_DELAY = 0.05  # seconds
+# Used until HEDGE_MIN_SAMPLES calls have been seen
+HEDGE_DEFAULT_DELAY = 1.0  # seconds
+HEDGE_MIN_SAMPLES = 20
+HEDGE_SAMPLE_SIZE = 500
+# At most this fraction of calls gets a duplicate
+HEDGE_MAX_RATIO = 0.1
 
 # Rate Limiting
 RATE_LIMIT_ENABLED = True
@@ -27,6 +100,49 @@ RATE_LIMIT = {
     "requests": 100,
     "period": 3600  # 1 hour
 }
+# Separate per-client budget for photos that are not cached yet and have to
+# be fetched from Places; cached photos are free. A trip shows about a dozen.
+PHOTO_RATE_LIMIT = {
+    "requests": 120,
+    "period": 3600  # 1 hour
+}
+# Most idle clients are forgotten first once this many are tracked
+RATE_LIMIT_MAX_CLIENTS = 10000
+# Only trust X-Forwarded-For when running behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "False").lower() == "true"
+
+# Outbound calls per second allowed to each provider
+UPSTREAM_QPS = {
+    "gemini": float(os.getenv("GEMINI_QPS", "2")),
+    "google_maps": float(os.getenv("GOOGLE_MAPS_QPS", "50"))
+}
+# How long an outbound call may queue for quota before failing
+UPSTREAM_MAX_WAIT = 5.0  # seconds
+
+# Health Checks and Circuit Breakers
+# Dependencies without a successful call in this long are probed in the background
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "30"))  # seconds
+HEALTH_PROBE_TIMEOUT = 5.0  # seconds
+# Geocoded by the Maps probe; bypasses the gazetteer and caches
+HEALTH_PROBE_LOCATION = "London"
+# A circuit opens when this fraction of the calls in the window failed...
+CIRCUIT_FAILURE_RATE = 0.5
+CIRCUIT_WINDOW = 60.0  # seconds
+# ...and at least this many calls were made
+CIRCUIT_MIN_CALLS = 5
+# How long an open circuit refuses calls before letting a trial call through
+CIRCUIT_OPEN_DURATION = 30.0  # seconds
+
+# Response Compression
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024  # bytes
+GZIP_LEVEL = 6
+# Brotli's default quality (11) costs far more CPU than it saves on dynamic responses
+BROTLI_QUALITY = 5
+
+# Metrics
+# Prometheus metrics on /metrics and Server-Timing headers on responses
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,32 +152,109 @@ CACHE_DIR = BASE_DIR / "cache"
 DATA_DIR.mkdir(exist_ok=True)
 CACHE_DIR.mkdir(exist_ok=True)
 
+# Flight Data
+FLIGHTS_FILE = Path(__file__).resolve().parent / "data" / "flights.json"
+# Larger files are compiled into a memory-mapped SQLite index instead of a dict
+FLIGHTS_INDEX_THRESHOLD = 50 * 1024 * 1024  # 50 MB
+# How often the flight file is checked for changes
+FLIGHTS_RELOAD_INTERVAL = 5.0  # seconds
+
+# Gazetteer
+# Known cities resolved locally instead of through the Geocoding API
+GAZETTEER_FILE = Path(__file__).resolve().parent / "data" / "cities.json"
+# Destinations listed by /api/supported-locations
+POPULAR_DESTINATIONS = ["London", "Paris", "New York", "Tokyo", "Dubai"]
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Cache Warming
+# Popular destinations and trips are computed in the background so their first requests hit the cache
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "False").lower() == "true"
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", str(6 * 3600)))  # seconds
+# The first run starts this long after startup
+WARMER_START_DELAY = 30.0  # seconds
+# Destinations and request shapes to warm; trip plans are warmed for the routes in FLIGHTS_FILE
+WARMER_TARGETS_FILE = Path(
+    os.getenv("WARMER_TARGETS_FILE", str(Path(__file__).resolve().parent / "data" / "warm_targets.json"))
+)
+# Travel months warmed after the current one
+WARMER_MONTHS_AHEAD = 2
+# Each upstream step waits until the provider has no queued calls and this fraction of its burst free
+WARMER_MIN_HEADROOM = 0.75
+WARMER_PAUSE = 1.0  # seconds between headroom checks
+# Gallery thumbnails are prepared at the width the frontend asks for
+WARMER_PHOTO_WIDTH = 640
+
+# Job Queue
+# Trip plans submitted to /api/jobs are queued here and survive restarts
+JOBS_DB = DATA_DIR / "jobs.sqlite3"
+# Plan pipelines each worker process runs at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Queued jobs beyond this are rejected with 503
+JOB_MAX_QUEUED = 1000
+# A running job whose worker has not reported progress for this long is requeued
+JOB_LEASE_TIMEOUT = 120  # seconds
+JOB_MAX_ATTEMPTS = 3
+# Partial progress is written to the queue at most this often
+JOB_PROGRESS_INTERVAL = 0.5  # seconds
+# Finished jobs (and their idempotency keys) are kept this long
+JOB_RESULT_TTL = 24 * 3600  # 1 day
+
+# Photo Proxy
+PHOTO_CACHE_DIR = CACHE_DIR / "photos"
+# Width fetched from Google; thumbnails are derived from it
+PHOTO_SOURCE_WIDTH = 1600
+PHOTO_WIDTHS = (320, 640, 1024)
+PHOTO_CACHE_MAX_AGE = 30 * 24 * 3600  # 30 days
+# Files unused for PHOTO_CACHE_MAX_AGE are deleted, then the least recently used until under the limit
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 2 GB
+PHOTO_CACHE_SWEEP_INTERVAL = 3600  # seconds
+# A file's last use (its mtime) is refreshed at most this often, to spare a write per request
+PHOTO_CACHE_TOUCH_INTERVAL = 24 * 3600  # 1 day
+
 # Logging Configuration
+LOGS_DIR = BASE_DIR / "logs"
+LOGS_DIR.mkdir(exist_ok=True)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" switches the console to the structured format the log file uses
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Fraction of DEBUG records kept, so debug dumps stay affordable under load
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+# Longest payload summary written to the log, in characters
+LOG_PAYLOAD_LIMIT = 512
+# Records waiting for the log thread; further records are dropped rather than blocking requests
+LOG_QUEUE_SIZE = 10000
+
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
         "standard": {
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+            "format": "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+        },
+        "json": {
+            "()": "app.logging_setup.JsonFormatter"
         },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
-            "formatter": "standard",
-            "level": "INFO",
+            "formatter": "json" if LOG_FORMAT == "json" else "standard",
+            "level": LOG_LEVEL,
         },
         "file": {
-            "class": "logging.FileHandler",
-            "filename": BASE_DIR / "logs" / "app.log",
-            "formatter": "standard",
-            "level": "INFO",
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOGS_DIR / "app.log",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "formatter": "json",
+            "level": LOG_LEVEL,
         },
     },
     "loggers": {
         "": {
             "handlers": ["console", "file"],
-            "level": "INFO",
+            "level": LOG_LEVEL,
         }
     },
 }
@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+from app.config import LOGGING_CONFIG, LOG_DEBUG_SAMPLE_RATE, LOG_PAYLOAD_LIMIT, LOG_QUEUE_SIZE
+
+# Set per request by RequestIdMiddleware and attached to every record logged while handling it
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Summary:
+    """
+    Size-capped, lazily rendered description of a payload, for log arguments.
+    Nothing is stringified unless the record is actually emitted.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = LOG_PAYLOAD_LIMIT):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, dict):
+            text = "{" + ", ".join(f"{key}: {self._shape(item)}" for key, item in value.items()) + "}"
+        elif isinstance(value, (list, tuple)):
+            text = f"[{len(value)} items]"
+        else:
+            text = str(value)
+        if len(text) > self.limit:
+            text = f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+    @staticmethod
+    def _shape(item: Any) -> str:
+        if isinstance(item, dict):
+            return f"{{{len(item)} keys}}"
+        if isinstance(item, (list, tuple)):
+            return f"[{len(item)} items]"
+        if isinstance(item, str) and len(item) > 80:
+            return f"<{len(item)} chars>"
+        return repr(item)
+
+
+def summarize(value: Any, limit: int = LOG_PAYLOAD_LIMIT) -> Summary:
+    return Summary(value, limit)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, request ID, message,
+    any `extra=` fields and the formatted exception.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SampledDebugFilter(logging.Filter):
+    """
+    Let through only a random fraction of DEBUG records; other levels always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the QueueListener thread without formatting them.
+
+    The stock QueueHandler renders the message in the calling thread; here the
+    request thread only tags the record with its request ID and renders any
+    traceback (frames cannot be inspected later). When the queue is full,
+    records are dropped and counted rather than blocking the request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging():
+    """
+    Apply LOGGING_CONFIG, then move the root logger's handlers behind a queue
+    so that formatting and I/O happen on a background thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    logging.config.dictConfig(LOGGING_CONFIG)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    queue_handler = BackgroundQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SampledDebugFilter(LOG_DEBUG_SAMPLE_RATE))
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,24 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query, Path, Header
 from fastapi.middleware.cors import CORSMiddleware
-from app.models.trip import TripRequest
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from app.models.trip import TripRequest, TripBatchRequest
 from app.services.gemini_service import GeminiService
-from app.services.google_maps_service import GoogleMapsService
+from app.services.google_maps_service import GoogleMapsService, normalize_location
+from app.services.http_client import HttpClient
+from app.services.trip_planner import TripPlanner
+from app.services.job_queue import JobQueue, IdempotencyConflictError, QueueFullError
+from app.services.photo_service import PhotoService, snap_width
+from app.services.cache import cache_stats
+from app.services.rate_limiter import ClientRateLimiter, QuotaExceededError
+from app.services.circuit_breaker import CircuitOpenError, breaker_stats
+from app.services.health import HealthMonitor
+from app.services.cache_warmer import CacheWarmer
+from app.services.deadline import DeadlineExceeded
+from app.services.metrics import REGISTRY
+from app.middleware import (
+    CompressionMiddleware, MetricsMiddleware, RateLimitMiddleware, RequestIdMiddleware, client_id
+)
+from app.responses import etag_matches, json_response
+from app.logging_setup import configure_logging, summarize
+from app.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT, RATE_LIMIT_MAX_CLIENTS, RATE_LIMIT_TRUST_FORWARDED, PHOTO_RATE_LIMIT,
+    PHOTO_CACHE_MAX_AGE, BATCH_GEMINI_CONCURRENCY, METRICS_ENABLED,
+    POPULAR_DESTINATIONS, AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, WARMER_ENABLED
+)
+import asyncio
+import json
 import logging
+import math
+from contextlib import aclosing
 from datetime import datetime
+from typing import Optional
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configure logging from LOGGING_CONFIG, written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Trip Planner API",
     description="AI-powered trip planning API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+# Per-client rate limiting, added before CORS so that 429s still carry CORS headers
+rate_limiter = ClientRateLimiter(
+    RATE_LIMIT["requests"], RATE_LIMIT["period"], max_clients=RATE_LIMIT_MAX_CLIENTS
+)
+# Photo requests are exempt from the limiter above; only cache misses cost anything upstream
+photo_rate_limiter = ClientRateLimiter(
+    PHOTO_RATE_LIMIT["requests"], PHOTO_RATE_LIMIT["period"], max_clients=RATE_LIMIT_MAX_CLIENTS
 )
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        # Served from local data, and autocomplete is called on every keystroke
+        exempt_paths=("/", "/health", "/metrics", "/api/supported-locations", "/api/locations/autocomplete"),
+        # Job polls and gallery photos follow a counted submission, dozens per trip, and
+        # every frontend user shares the Streamlit server's address. Photo fetches
+        # from Places are limited by photo_rate_limiter instead.
+        exempt_prefixes=("/api/jobs/", "/api/photos/"),
+        trust_forwarded=RATE_LIMIT_TRUST_FORWARDED
+    )
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,115 +74,340 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so that rate-limited and CORS preflight requests are measured too
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, exclude_paths=("/metrics",))
+app.add_middleware(RequestIdMiddleware)
 
 # Initialize services
+http_client = HttpClient()
 gemini_service = GeminiService()
-google_maps_service = GoogleMapsService()
+google_maps_service = GoogleMapsService(http_client)
+trip_planner = TripPlanner(gemini_service, google_maps_service)
+photo_service = PhotoService(google_maps_service)
+job_queue = JobQueue(trip_planner)
+# Upstream health is probed in the background; /health only reads the result
+health_monitor = HealthMonitor()
+health_monitor.add_check("gemini", gemini_service.breaker, gemini_service.probe)
+health_monitor.add_check("google_maps", google_maps_service.breaker, google_maps_service.probe)
+# Popular destinations and trips are precomputed in the background, with quota live traffic leaves over
+cache_warmer = CacheWarmer(trip_planner, photo_service)
 logger.info("Services initialized successfully")
 
 
+@app.on_event("startup")
+async def start_services():
+    await http_client.start()
+    job_queue.start()
+    health_monitor.start()
+    photo_service.start()
+    if WARMER_ENABLED:
+        cache_warmer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    await cache_warmer.stop()
+    await health_monitor.stop()
+    await job_queue.stop()
+    await photo_service.stop()
+    await http_client.close()
+    google_maps_service.close()
+    trip_planner.close()
+    photo_service.close()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Trip Planner API is running"}
 
 
+FIELDS_DESCRIPTION = (
+    "Comma-separated dotted paths to return, e.g. tripPlan,accommodations.hotels.name; "
+    "paths prefixed with - are left out, e.g. -accommodations.hotels.reviews"
+)
+
+
 @app.post("/api/plan-trip")
-async def plan_trip(trip_request: TripRequest):
+async def plan_trip(
+    trip_request: TripRequest,
+    request: Request,
+    fields: Optional[str] = Query(None, max_length=500, description=FIELDS_DESCRIPTION)
+):
     """
     Generate a trip plan using the Gemini LLM, fetch hotels, flights,
     and photos from Google Maps, then return all data in a structured response.
+    Sections not ready within the deadline are returned empty and marked in "sectionStatus".
+    The response carries an ETag, but as a POST it is always sent in full.
     """
-    logger.info(f"Received trip request: {trip_request}")
+    logger.info(
+        "Received trip request: %s -> %s, %s days, %s travelers",
+        trip_request.fromLocation, trip_request.destination, trip_request.duration, trip_request.travelers
+    )
     try:
-        # 1) Generate trip plan text via Gemini
-        logger.info("Generating trip plan with Gemini")
-        response_text = await gemini_service.generate_trip_plan(trip_request)
-        logger.info(f"Received AI response: {response_text[:200]}...")
-
-        # 2) Parse AI response into sections
-        sections = response_text.split("#")
-        overview = next((s for s in sections if "OVERVIEW" in s), "").replace("OVERVIEW", "").strip()
-        itinerary = next((s for s in sections if "ITINERARY" in s), "").replace("ITINERARY", "").strip()
-        practical_info = next((s for s in sections if "PRACTICAL_INFO" in s), "").replace("PRACTICAL_INFO", "").strip()
-
-        # 3) Fetch additional details
-        logger.info("Fetching additional trip details")
-        coordinates = await google_maps_service.get_coordinates(trip_request.destination)
-        flights_info = google_maps_service.get_realistic_flights(trip_request.fromLocation, trip_request.destination)
-        hotels_info = await google_maps_service.get_hotels(trip_request.destination)
-        photos = await google_maps_service.get_places_photos(trip_request.destination)
-
-        # Provide a fallback if no photos found
-        if not photos:
-            logger.warning("No photos retrieved from Google Maps API")
-            photos = ["default_photo_url"]  # Temporary fallback
-
-        # 4) Construct final response
-        result = {
-            "tripPlan": {
-                "overview": overview,
-                "itinerary": itinerary,
-                "practicalInfo": practical_info
-            },
-            "flightsInfo": flights_info,
-            "accommodations": hotels_info,
-            "map_data": {
-                "latitude": [float(coordinates["lat"])],
-                "longitude": [float(coordinates["lng"])]
-            },
-            "photos": photos
-        }
-        logger.info(f"Final trip response: {result}")
-        return result
+        # Gemini generation and the Google Maps lookups run concurrently
+        result = await trip_planner.plan_trip(trip_request)
+        logger.debug("Trip response: %s", summarize(result))
+        return json_response(request, result, fields)
 
+    except QuotaExceededError as e:
+        logger.warning("Upstream quota exhausted: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except DeadlineExceeded as e:
+        logger.warning("Trip plan missed its deadline: %s", e)
+        raise HTTPException(status_code=504, detail="Trip plan could not be generated in time")
+    except CircuitOpenError as e:
+        logger.warning("Refusing trip plan: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after) or 1)})
     except Exception as e:
-        logger.error(f"Error generating trip plan: {str(e)}", exc_info=True)
+        logger.error("Error generating trip plan: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/health")
-async def health_check():
+@app.post("/api/plan-trip/stream")
+async def plan_trip_stream(trip_request: TripRequest, request: Request):
     """
-    Simple health check endpoint to verify connectivity with external services.
+    Stream the trip plan as server-sent events. Gemini text arrives as "section"
+    events while it is generated, followed by "coordinates", "accommodations",
+    "photos" and "flights" as each lookup completes, then "sectionStatus" and
+    a final "done".
+    If the client disconnects the generation still finishes and is cached.
+    """
+    logger.info(
+        "Received streaming trip request: %s -> %s, %s days, %s travelers",
+        trip_request.fromLocation, trip_request.destination, trip_request.duration, trip_request.travelers
+    )
+
+    async def event_stream():
+        async with aclosing(trip_planner.stream_trip(trip_request)) as events:
+            async for event, data in events:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, closing trip plan stream")
+                    return
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _job_response(job):
+    body = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['id']}",
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    }
+    if "queue_position" in job:
+        body["queue_position"] = job["queue_position"]
+    if job["status"] in ("running", "succeeded", "failed"):
+        body["progress"] = job["progress"]
+    if job["status"] == "succeeded":
+        body["result"] = job["result"]
+    if job["status"] == "failed":
+        body["error"] = job["error"]
+    return body
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(
+    trip_request: TripRequest,
+    response: Response,
+    idempotency_key: str = Header(None, max_length=128)
+):
+    """
+    Queue a trip plan and return its job ID immediately. Poll the returned
+    status URL for progress and the result. Retrying with the same
+    Idempotency-Key header returns the original job instead of queueing
+    another; a job that failed is queued again.
     """
     try:
-        services_status = {
-            "gemini_service": bool(gemini_service),
-            "google_maps_service": bool(google_maps_service)
-        }
-        test_coordinates = await google_maps_service.get_coordinates("London")
-        api_status = bool(test_coordinates.get("lat"))
-
-        return {
-            "status": "healthy" if all(services_status.values()) and api_status else "degraded",
-            "services": services_status,
-            "api_status": "operational" if api_status else "error",
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "status": "unhealthy",
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+        job, created = await job_queue.submit(trip_request, idempotency_key)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFullError as e:
+        logger.warning("Rejecting job, queue is full: %s", e)
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "30"})
+    if created:
+        logger.info("Queued job %s for %s", job["id"], trip_request.destination)
+    else:
+        response.status_code = 200
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return _job_response(job)
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, max_length=500, description=FIELDS_DESCRIPTION)
+):
+    """
+    Job status with the partial progress so far, and the trip plan once it
+    has succeeded. Polls sending the last ETag in If-None-Match get a 304
+    until the job has moved on.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    headers = {"Retry-After": "1"} if job["status"] in ("queued", "running") else {}
+    return json_response(request, _job_response(job), fields, headers=headers)
+
+
+@app.post("/api/plan-trips/batch")
+async def plan_trips_batch(batch: TripBatchRequest, request: Request):
+    """
+    Plan a batch of trips, streaming one JSON line per item as it finishes
+    (in completion order, tagged with its index), then a summary line.
+    Geocodes, hotels and photos are fetched once per unique destination.
+    Each item counts as a request against the client's rate limit.
+    """
+    if RATE_LIMIT_ENABLED and len(batch.requests) > 1:
+        if len(batch.requests) > rate_limiter.capacity:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Batches are limited to {rate_limiter.capacity} trips by the rate limit"
+            )
+        # The middleware has counted the request itself
+        allowed, retry_after = rate_limiter.check(
+            client_id(request.scope, RATE_LIMIT_TRUST_FORWARDED), cost=len(batch.requests) - 1
         )
+        if not allowed:
+            raise HTTPException(
+                status_code=429, detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    # More concurrent generations than the Gemini burst would only fail waiting for quota
+    concurrency = min(batch.concurrency or BATCH_GEMINI_CONCURRENCY, max(1, int(gemini_service.governor.burst)))
+    unique_destinations = len({normalize_location(r.destination) for r in batch.requests})
+    logger.info(
+        "Received batch of %d trip requests (%d destinations, concurrency %d)",
+        len(batch.requests), unique_destinations, concurrency
+    )
 
+    async def results_stream():
+        failed = 0
+        async with aclosing(trip_planner.plan_batch(batch.requests, concurrency)) as results:
+            async for index, result in results:
+                if isinstance(result, Exception):
+                    failed += 1
+                    item = {"index": index, "status": "error", "detail": str(result)}
+                else:
+                    item = {"index": index, "status": "ok", "result": result}
+                yield json.dumps(item) + "\n"
+        yield json.dumps({
+            "done": True,
+            "total": len(batch.requests),
+            "failed": failed,
+            "unique_destinations": unique_destinations
+        }) + "\n"
 
-@app.get("/api/supported-locations")
-async def get_supported_locations():
+    return StreamingResponse(results_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/photos/{photo_reference}")
+async def get_photo(
+    request: Request,
+    photo_reference: str = Path(..., min_length=10, max_length=2048, pattern=r"^[A-Za-z0-9_-]+$"),
+    w: int = Query(None, ge=1, le=4096, description="Requested width in pixels"),
+    format: str = Query(None, pattern="^(webp|jpeg)$", description="Image format")
+):
     """
-    Return a list of popular destinations and their coordinates.
+    Serve a resized Places photo from the photo cache, fetching it from Google
+    on first use. Responses carry a stable ETag and long-lived Cache-Control.
+    Fetches count against the client's PHOTO_RATE_LIMIT budget.
     """
+    width = snap_width(w)
+    fmt = format or ("webp" if "image/webp" in request.headers.get("accept", "") else "jpeg")
+    headers = {
+        "Cache-Control": f"public, max-age={PHOTO_CACHE_MAX_AGE}, immutable",
+        "Vary": "Accept"
+    }
+    etag = await photo_service.etag_for(photo_reference, width, fmt)
+    if etag and etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    if etag is None and RATE_LIMIT_ENABLED:
+        allowed, retry_after = photo_rate_limiter.check(client_id(request.scope, RATE_LIMIT_TRUST_FORWARDED))
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Photo rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
     try:
-        popular_destinations = ["London", "Paris", "New York", "Tokyo", "Dubai"]
-        locations = {}
-        for city in popular_destinations:
-            coords = await google_maps_service.get_coordinates(city)
-            locations[city] = coords
-        return {"supported_locations": locations, "total_count": len(locations)}
+        content, etag, media_type = await photo_service.get_thumbnail(photo_reference, width, fmt)
     except Exception as e:
-        logger.error(f"Error getting supported locations: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch supported locations")
+        logger.error("Error serving photo: %s", e)
+        raise HTTPException(status_code=404, detail="Photo not available")
+    return Response(content=content, media_type=media_type, headers={**headers, "ETag": etag})
+
+
+@app.get("/health")
+async def health_check():
+    """
+    Report upstream health from the background prober and circuit breakers.
+    Answers from memory; it never calls Gemini or Google Maps itself.
+    """
+    return {**health_monitor.status(), "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/api/supported-locations")
+async def get_supported_locations():
+    """
+    Return a list of popular destinations and their coordinates, from the gazetteer.
+    """
+    locations = {}
+    for name in POPULAR_DESTINATIONS:
+        city = google_maps_service.gazetteer.lookup(name)
+        if city is not None:
+            locations[name] = {"lat": city["lat"], "lng": city["lng"]}
+    return {"supported_locations": locations, "total_count": len(locations)}
+
+
+@app.get("/api/locations/autocomplete")
+async def autocomplete_locations(
+    q: str = Query("", max_length=100),
+    limit: int = Query(AUTOCOMPLETE_LIMIT, ge=1, le=AUTOCOMPLETE_MAX_LIMIT)
+):
+    """
+    Suggest known cities whose name, alias or a word of the name starts with `q`.
+    """
+    suggestions = google_maps_service.gazetteer.autocomplete(q, limit)
+    return {"query": q, "suggestions": suggestions}
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Request, stage and cache metrics in the Prometheus text exposition format.
+    """
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/stats")
+async def get_stats():
+    """
+    Return cache, rate limit and upstream quota counters so capacity can be tuned.
+    """
+    return {
+        "caches": cache_stats(),
+        "circuits": breaker_stats(),
+        "hedging": {name: hedger.stats() for name, hedger in google_maps_service.hedgers.items()},
+        "jobs": await asyncio.to_thread(job_queue.store.counts),
+        "plan_cache": trip_planner.plan_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "photo_rate_limit": photo_rate_limiter.stats(),
+        "upstream": {
+            "gemini": gemini_service.governor.stats(),
+            "google_maps": google_maps_service.governor.stats()
+        },
+        "warmer": cache_warmer.status(),
+        "timestamp": datetime.now().isoformat()
+    }
@@ -0,0 +1,261 @@
+import gzip
+import math
+import re
+import time
+import uuid
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+from app.logging_setup import request_id_var
+from app.services.rate_limiter import ClientRateLimiter
+from app.services.metrics import (
+    HTTP_DURATION, HTTP_IN_FLIGHT, HTTP_REQUESTS,
+    end_request_timing, server_timing, start_request_timing
+)
+
+try:
+    import brotli
+except ImportError:
+    # Without the brotli package responses are only gzipped
+    brotli = None
+
+
+def client_id(scope, trust_forwarded: bool = False) -> str:
+    """
+    The address a request is rate limited by: the first X-Forwarded-For hop
+    when the proxy in front is trusted, otherwise the peer address.
+    """
+    if trust_forwarded:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware enforcing a per-client request budget. Requests over the
+    budget get a 429 with a Retry-After header before reaching the app.
+    Requests for `exempt_paths`, or paths under `exempt_prefixes`, are not counted.
+    """
+
+    def __init__(
+        self, app, limiter: ClientRateLimiter, exempt_paths=(), exempt_prefixes=(), trust_forwarded: bool = False
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = set(exempt_paths)
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] in self.exempt_paths
+            or scope["path"].startswith(self.exempt_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = self.limiter.check(client_id(scope, self.trust_forwarded))
+        if not allowed:
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving each request an ID, taken from a well-formed
+    X-Request-ID header or generated, which is attached to every log record
+    written while handling it and echoed in the response.
+    """
+
+    VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if self.VALID_ID.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, durations and in-flight requests
+    per route, and adding a Server-Timing header built from the spans recorded
+    while the request was handled. For streamed responses the header only
+    covers the stages finished before the first byte.
+    """
+
+    def __init__(self, app, exclude_paths=()):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+        self._routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        timings, token = start_request_timing()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - start)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            end_request_timing(token)
+            route = self._route(scope)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - start, route=route)
+
+    def _route(self, scope) -> str:
+        # Label by route template rather than raw path to keep label cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path
+                for route in getattr(scope.get("app"), "routes", [])
+            }
+        return self._routes.get(endpoint, "unmatched")
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with brotli or gzip, whichever
+    the client prefers in Accept-Encoding (brotli wins ties). Only whole
+    bodies of text and JSON types of at least `minimum_size` bytes are
+    compressed; streamed responses are passed through so that each event is
+    still sent as soon as it is produced.
+    """
+
+    COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript")
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = GZIP_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it is worth compressing
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if message.get("more_body") or not self._compressible(headers, body):
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None:
+                body = self._compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The compressed bytes are no longer what a strong ETag promised
+                    headers["ETag"] = f"W/{etag}"
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _negotiate(self, accept_encoding: str):
+        """
+        The supported encoding with the highest q-value in Accept-Encoding, or None.
+        """
+        weights = {}
+        for item in accept_encoding.lower().split(","):
+            name, _, params = item.strip().partition(";")
+            weight = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    weight = float(params.strip()[2:])
+                except ValueError:
+                    weight = 0.0
+            if name:
+                weights[name.strip()] = weight
+        wildcard = weights.get("*", 0.0)
+        best, best_weight = None, 0.0
+        for encoding in self.encodings:
+            weight = weights.get(encoding, wildcard)
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+    def _compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        return (
+            len(body) >= self.minimum_size
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(self.COMPRESSIBLE_TYPES)
+        )
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
@@ -1,5 +1,17 @@
+import calendar
 from pydantic import BaseModel, Field
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+# Bit positions of the interests offered by the trip form
+INTEREST_FLAGS = ("historical", "nature", "cultural", "shopping", "food", "adventure")
+
+
+def normalize_text(value: str) -> str:
+    """
+    Trim, case-fold and collapse whitespace so equivalent free-text inputs compare equal.
+    """
+    return " ".join(value.casefold().split())
+
 
 class TripRequest(BaseModel):
     fromLocation: str = Field(..., description="Departure location")
@@ -9,6 +21,43 @@ class TripRequest(BaseModel):
     duration: Optional[int] = Field(7, ge=1, le=30, description="Trip duration in days")
     interests: Dict[str, bool] = Field(..., description="Travel interests")
 
+    def interest_mask(self) -> int:
+        """
+        Encode the selected form interests as a bitmask in INTEREST_FLAGS order.
+        """
+        mask = 0
+        for bit, name in enumerate(INTEREST_FLAGS):
+            if self.interests.get(name):
+                mask |= 1 << bit
+        return mask
+
+    def travel_month(self) -> str:
+        """
+        Month name of the travel date ("2025-04" -> "April"), or the raw value if it does not parse.
+        """
+        parts = self.travelDate.strip().split("-")
+        if len(parts) >= 2 and parts[1].isdigit() and 1 <= int(parts[1]) <= 12:
+            return calendar.month_name[int(parts[1])]
+        return self.travelDate.strip()
+
+    def canonical_key(self) -> str:
+        """
+        Key identifying requests that produce the same trip plan, used for response caching.
+        """
+        extra_interests = sorted(
+            normalize_text(name) for name, selected in self.interests.items()
+            if selected and name not in INTEREST_FLAGS
+        )
+        return "|".join([
+            normalize_text(self.fromLocation),
+            normalize_text(self.destination),
+            self.travelDate.strip(),
+            str(self.duration or 7),
+            str(self.travelers),
+            str(self.interest_mask()),
+            ",".join(extra_interests)
+        ])
+
     class Config:
         json_schema_extra = {
             "example": {
@@ -27,3 +76,26 @@ class TripRequest(BaseModel):
                 }
             }
         }
+
+
+class TripBatchRequest(BaseModel):
+    requests: List[TripRequest] = Field(..., min_length=1, max_length=500, description="Trips to plan")
+    concurrency: Optional[int] = Field(
+        None, ge=1, le=32, description="Concurrent Gemini generations, capped at the Gemini quota's burst"
+    )
+
+
+class DayPlan(BaseModel):
+    day: int = Field(..., description="Day number within the trip")
+    title: str = Field("", description="Day heading, e.g. 'Arrival in London'")
+    morning: str = Field("", description="Morning suggestions (markdown)")
+    afternoon: str = Field("", description="Afternoon suggestions (markdown)")
+    evening: str = Field("", description="Evening suggestions (markdown)")
+    notes: str = Field("", description="Day text not attributed to a time slot (markdown)")
+
+
+class TripPlan(BaseModel):
+    overview: str = Field("", description="Destination overview (markdown)")
+    itinerary: str = Field("", description="Full itinerary text (markdown)")
+    practicalInfo: str = Field("", description="Practical information (markdown)")
+    days: List[DayPlan] = Field(default_factory=list, description="Itinerary split into days")
@@ -0,0 +1,109 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def parse_fields(fields: Optional[str]) -> Dict[str, List[List[str]]]:
+    """
+    Split a `fields` parameter such as "tripPlan,accommodations.hotels.name" or
+    "-accommodations.hotels.reviews" into the dotted paths to include and the
+    ones (prefixed with "-") to exclude.
+    """
+    selection = {"include": [], "exclude": []}
+    for field in (fields or "").split(","):
+        field = field.strip()
+        if not field:
+            continue
+        kind = "exclude" if field.startswith("-") else "include"
+        path = [part for part in field.lstrip("-").split(".") if part]
+        if path:
+            selection[kind].append(path)
+    return selection
+
+
+def select_fields(data: Any, fields: Optional[str]) -> Any:
+    """
+    Keep only the included paths of `data` (everything when none are given),
+    then drop the excluded ones. Paths pass through lists, applying to each item.
+    """
+    selection = parse_fields(fields)
+    if selection["include"]:
+        data = _include(data, selection["include"])
+    if selection["exclude"]:
+        data = _exclude(data, selection["exclude"])
+    return data
+
+
+def _include(data: Any, paths: List[List[str]]) -> Any:
+    if any(not path for path in paths):
+        return data
+    if isinstance(data, list):
+        return [_include(item, paths) for item in data]
+    if not isinstance(data, dict):
+        return data
+    selected = {}
+    for key, value in data.items():
+        subpaths = [path[1:] for path in paths if path[0] == key]
+        if subpaths:
+            selected[key] = _include(value, subpaths)
+    return selected
+
+
+def _exclude(data: Any, paths: List[List[str]]) -> Any:
+    if isinstance(data, list):
+        return [_exclude(item, paths) for item in data]
+    if not isinstance(data, dict):
+        return data
+    selected = {}
+    for key, value in data.items():
+        subpaths = [path[1:] for path in paths if path[0] == key]
+        if any(not path for path in subpaths):
+            continue
+        selected[key] = _exclude(value, subpaths) if subpaths else value
+    return selected
+
+
+def render(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def etag_for(body: bytes) -> str:
+    # Weak, since the compression middleware may send the body in another encoding
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches `etag`, compared weakly as RFC 9110 requires.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def json_response(
+    request: Request,
+    content: Any,
+    fields: Optional[str] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Render `content` with orjson, without FastAPI's jsonable_encoder pass,
+    after applying the `fields` selection. The response carries an ETag, and
+    a GET or HEAD whose If-None-Match matches it gets an empty 304 instead;
+    other methods always get the body.
+    """
+    body = render(select_fields(content, fields))
+    etag = etag_for(body)
+    headers = {**(headers or {}), "ETag": etag}
+    if (
+        status_code == 200
+        and request.method in ("GET", "HEAD")
+        and etag_matches(request.headers.get("if-none-match", ""), etag)
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
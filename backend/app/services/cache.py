@@ -0,0 +1,304 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import CACHE_DIR, CACHE_ENABLED, CACHE_TIMEOUT, DISK_CACHE_FLUSH_INTERVAL
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Every cache registers itself here so its counters can be reported
+_registry: Dict[str, Any] = {}
+_MISSING = object()
+
+
+def register_cache(name: str, cache: Any):
+    """
+    Include a cache in cache_stats() and /metrics. Its stats() must report at
+    least "size", "hits", "misses" and "hit_ratio".
+    """
+    _registry[name] = cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return hit/miss counters for every cache created by the application.
+    """
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def collect_cache_metrics():
+    """
+    Expose cache_stats() as Prometheus metric families, read at scrape time.
+    """
+    stats = cache_stats()
+    yield ("trip_planner_cache_hits_total", "counter", "Cache lookups served from memory or disk.",
+           [({"cache": name}, s["hits"]) for name, s in stats.items()])
+    yield ("trip_planner_cache_misses_total", "counter", "Cache lookups that missed.",
+           [({"cache": name}, s["misses"]) for name, s in stats.items()])
+    yield ("trip_planner_cache_hit_ratio", "gauge", "Fraction of cache lookups that hit.",
+           [({"cache": name}, s["hit_ratio"]) for name, s in stats.items()])
+    yield ("trip_planner_cache_entries", "gauge", "Entries held in memory.",
+           [({"cache": name}, s["size"]) for name, s in stats.items()])
+
+
+REGISTRY.register_collector(collect_cache_metrics)
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after a TTL.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Persistent key/value store in a SQLite file, shared by all workers on the host.
+    Values are stored as JSON, so only JSON-serializable data can be cached.
+
+    set() and delete() only queue the write: a background thread commits
+    queued writes in batches every `flush_interval` seconds, and get() sees
+    them before they are committed. get() reads the file, so call it off the
+    event loop.
+    """
+
+    def __init__(self, path: Path, ttl: float = CACHE_TIMEOUT, flush_interval: float = DISK_CACHE_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # key -> (JSON value, expires_at) to write, or None to delete
+        self._pending: Dict[str, Optional[Tuple[str, float]]] = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name=f"disk-cache-{self.path.stem}", daemon=True)
+        self._writer.start()
+
+    def get(self, key: str) -> Any:
+        with self._pending_lock:
+            row = self._pending.get(key, _MISSING)
+        if row is _MISSING:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._queue(key, (json.dumps(value), expires_at))
+
+    def delete(self, key: str):
+        self._queue(key, None)
+
+    def _queue(self, key: str, row: Optional[Tuple[str, float]]):
+        with self._pending_lock:
+            self._pending[key] = row
+        self._wakeup.set()
+
+    def _write_loop(self):
+        while True:
+            self._wakeup.wait()
+            if self._closed:
+                return
+            self._wakeup.clear()
+            # Let the writes of a burst accumulate into one transaction
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Commit the queued writes in one transaction.
+        """
+        with self._pending_lock:
+            batch = dict(self._pending)
+        if not batch:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    [(key, *row) for key, row in batch.items() if row is not None]
+                )
+                self._conn.executemany(
+                    "DELETE FROM entries WHERE key = ?", [(key,) for key, row in batch.items() if row is None]
+                )
+        except sqlite3.Error as e:
+            logger.warning("Could not write %d entries to disk cache %s: %s", len(batch), self.path.name, e)
+        with self._pending_lock:
+            # Keep writes queued while this batch was committed
+            for key, row in batch.items():
+                if self._pending.get(key, _MISSING) is row:
+                    del self._pending[key]
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    An in-process TTLCache in front of an optional DiskCache stored under CACHE_DIR.
+    Disk hits are promoted into memory. Does nothing when CACHE_ENABLED is off.
+    Lookups that miss memory read the disk on a worker thread, hence get() is a coroutine.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = CACHE_TIMEOUT,
+        disk_ttl: Optional[float] = None,
+        persistent: bool = True
+    ):
+        self.name = name
+        self.enabled = CACHE_ENABLED
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = None
+        if self.enabled and persistent:
+            try:
+                self.disk = DiskCache(CACHE_DIR / f"{name}.sqlite3", ttl=disk_ttl or ttl)
+            except sqlite3.Error as e:
+                logger.warning("Disk cache '%s' unavailable, using memory only: %s", name, e)
+        self.disk_hits = 0
+        register_cache(name, self)
+
+    async def get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, disk_ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl=disk_ttl)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning("Could not persist '%s' to disk cache '%s': %s", key, self.name, e)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory.hits + self.disk_hits
+        misses = self.memory.misses - self.disk_hits
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self.memory),
+            "hits": hits,
+            "misses": misses,
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one shared computation.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so that one caller going away does not cancel the shared computation
+        return await asyncio.shield(future)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
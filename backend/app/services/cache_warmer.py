@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.config import (
+    POPULAR_DESTINATIONS, WARMER_INTERVAL, WARMER_START_DELAY, WARMER_TARGETS_FILE,
+    WARMER_MONTHS_AHEAD, WARMER_MIN_HEADROOM, WARMER_PAUSE, WARMER_PHOTO_WIDTH
+)
+from app.models.trip import TripRequest
+from app.services.metrics import REGISTRY
+from app.services.photo_service import PhotoService, snap_width
+from app.services.trip_planner import TripPlanner, is_complete_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHAPE = {"travelers": 2, "duration": 7, "interests": {}}
+# What the warmer precomputes, in the order of a run
+KINDS = ("destinations", "photos", "guides", "plans")
+
+
+class CacheWarmer:
+    """
+    Precomputes what the first requests for popular trips would otherwise
+    wait for, so they are cache hits from the start of the day:
+
+    - destinations: geocode, hotels and landmark photos of each destination
+      in WARMER_TARGETS_FILE and each destination of a route in the flight data
+    - photos: the gallery thumbnails of those destinations
+    - guides: the destination guide of each destination for this month and
+      the next WARMER_MONTHS_AHEAD
+    - plans: whole trip plans for each route, month and request shape listed
+      in WARMER_TARGETS_FILE; plans that are still fresh are left alone
+
+    Runs every `interval` seconds in the background. Warming only uses upstream
+    quota that live traffic leaves over: each step that may call a provider
+    first waits until nobody is queued on its governor and WARMER_MIN_HEADROOM
+    of its burst is free, and steps run one at a time. Steps needing a
+    provider whose circuit is open fail without being attempted.
+    """
+
+    def __init__(
+        self,
+        trip_planner: TripPlanner,
+        photo_service: PhotoService,
+        interval: float = WARMER_INTERVAL,
+        targets_file: Path = WARMER_TARGETS_FILE
+    ):
+        self.trip_planner = trip_planner
+        self.photo_service = photo_service
+        self.interval = interval
+        self.targets_file = Path(targets_file)
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.paused = 0.0
+        self.next_run_at: Optional[float] = None
+        REGISTRY.register_collector(self.collect_metrics)
+
+    def start(self, delay: float = WARMER_START_DELAY):
+        self._task = asyncio.create_task(self._run(delay))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, delay: float):
+        self.next_run_at = time.time() + delay
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await self.warm()
+            except Exception as e:
+                logger.error("Error warming caches: %s", e, exc_info=True)
+            self.next_run_at = time.time() + self.interval
+            await asyncio.sleep(self.interval)
+
+    def load_targets(self) -> Dict[str, Any]:
+        """
+        Destinations, trip requests and months to warm. Falls back to
+        POPULAR_DESTINATIONS and the default form values if the targets file is missing.
+        """
+        targets = {}
+        try:
+            with open(self.targets_file) as f:
+                targets = json.load(f)
+        except FileNotFoundError:
+            logger.warning("Warm targets file not found: %s", self.targets_file)
+        except ValueError as e:
+            logger.error("Invalid warm targets file %s: %s", self.targets_file, e)
+
+        gazetteer = self.trip_planner.google_maps_service.gazetteer
+        routes = []
+        for origin, destination in self.trip_planner.google_maps_service.flight_store.routes():
+            # Route keys are normalized; plan with the names users see
+            origin_city, destination_city = gazetteer.lookup(origin), gazetteer.lookup(destination)
+            routes.append((
+                origin_city["name"] if origin_city else origin.title(),
+                destination_city["name"] if destination_city else destination.title()
+            ))
+
+        destinations = list(dict.fromkeys([
+            *targets.get("destinations", POPULAR_DESTINATIONS),
+            *(destination for _, destination in routes)
+        ]))
+        months = self._months()
+        requests = []
+        for shape in targets.get("shapes", [DEFAULT_SHAPE]):
+            try:
+                TripRequest(fromLocation="", destination="", travelDate="", **shape)
+            except ValueError as e:
+                logger.error("Skipping invalid warm shape %s: %s", shape, e)
+                continue
+            requests.extend(
+                TripRequest(fromLocation=origin, destination=destination, travelDate=month, **shape)
+                for month in months for origin, destination in routes
+            )
+        return {"destinations": destinations, "months": months, "requests": requests}
+
+    @staticmethod
+    def _months() -> List[str]:
+        today = date.today()
+        months = []
+        for offset in range(WARMER_MONTHS_AHEAD + 1):
+            index = today.month - 1 + offset
+            months.append(f"{today.year + index // 12}-{index % 12 + 1:02d}")
+        return months
+
+    async def warm(self) -> Dict[str, Any]:
+        """
+        Warm every target once and return the run's coverage report. Each kind
+        of target counts those already cached ("fresh"), computed by this run
+        ("warmed") and still missing ("failed"). Destinations are looked up on
+        every run and count as warmed: their lookups go through the Maps
+        caches, which only call Google for what has expired.
+        """
+        self.running = True
+        started = time.time()
+        self.paused = 0.0
+        coverage = {kind: {"targets": 0, "fresh": 0, "warmed": 0, "failed": 0} for kind in KINDS}
+        try:
+            targets = self.load_targets()
+            logger.info(
+                "Warming caches for %d destinations and %d trip plans",
+                len(targets["destinations"]), len(targets["requests"])
+            )
+            maps = self.trip_planner.google_maps_service
+            gemini = self.trip_planner.gemini_service
+
+            photos = []
+            for destination in targets["destinations"]:
+                async def fetch_details(destination=destination):
+                    _, hotels, destination_photos, status = await self.trip_planner.get_destination_details(destination)
+                    photos.extend(destination_photos)
+                    return (
+                        all(s == "ok" for s in status.values())
+                        and not hotels.get("partial") and bool(destination_photos)
+                    )
+                await self._step(coverage["destinations"], fetch_details, maps)
+
+            width = snap_width(WARMER_PHOTO_WIDTH)
+            for url in dict.fromkeys(photos):
+                photo_reference = url.rsplit("/", 1)[-1]
+                if await self.photo_service.etag_for(photo_reference, width, "webp") is not None:
+                    self._count(coverage["photos"], "fresh")
+                    continue
+
+                async def fetch_thumbnail(photo_reference=photo_reference):
+                    await self.photo_service.get_thumbnail(photo_reference, width, "webp")
+                    return True
+                await self._step(coverage["photos"], fetch_thumbnail, maps)
+
+            # Guides first: every plan for the destination and month shares them
+            for month in targets["months"]:
+                for destination in targets["destinations"]:
+                    guide_request = TripRequest(
+                        fromLocation="", destination=destination, travelDate=month, **DEFAULT_SHAPE
+                    )
+                    if await self.trip_planner.has_destination_guide(guide_request):
+                        self._count(coverage["guides"], "fresh")
+                        continue
+
+                    async def fetch_guide(guide_request=guide_request):
+                        guide = await self.trip_planner.get_destination_guide(guide_request)
+                        return bool(guide["overview"] and guide["practicalInfo"])
+                    await self._step(coverage["guides"], fetch_guide, gemini)
+
+            for trip_request in targets["requests"]:
+                age = await self.trip_planner.plan_age(trip_request)
+                if age is not None and age < self.trip_planner.plan_cache.ttl:
+                    self._count(coverage["plans"], "fresh")
+                    continue
+
+                async def fetch_plan(trip_request=trip_request):
+                    return is_complete_plan(await self.trip_planner.refresh_plan(trip_request))
+                await self._step(coverage["plans"], fetch_plan, gemini, maps)
+        finally:
+            self.running = False
+
+        for counts in coverage.values():
+            cached = counts["fresh"] + counts["warmed"]
+            counts["ratio"] = round(cached / counts["targets"], 4) if counts["targets"] else 1.0
+        finished = time.time()
+        self.runs += 1
+        self.last_run = {
+            "started_at": _isoformat(started),
+            "finished_at": _isoformat(finished),
+            "duration_seconds": round(finished - started, 1),
+            "paused_seconds": round(self.paused, 1),
+            "coverage": coverage
+        }
+        logger.info(
+            "Cache warming finished in %.1fs: %s", finished - started,
+            ", ".join(f"{kind} {c['fresh'] + c['warmed']}/{c['targets']}" for kind, c in coverage.items())
+        )
+        return self.last_run
+
+    async def _step(self, counts: Dict[str, int], warm: Callable[[], Awaitable[bool]], *services):
+        """
+        Run one warming step once `services` have quota to spare and count its outcome.
+        """
+        try:
+            for service in services:
+                service.breaker.raise_if_open()
+            await self._wait_for_headroom(services)
+            ok = await warm()
+        except Exception as e:
+            logger.warning("Cache warming step failed: %s", e)
+            ok = False
+        self._count(counts, "warmed" if ok else "failed")
+
+    async def _wait_for_headroom(self, services):
+        started = time.monotonic()
+        while any(
+            service.governor.waiting or service.governor.headroom() < WARMER_MIN_HEADROOM
+            for service in services
+        ):
+            await asyncio.sleep(WARMER_PAUSE)
+        self.paused += time.monotonic() - started
+
+    @staticmethod
+    def _count(counts: Dict[str, int], outcome: str):
+        counts["targets"] += 1
+        counts[outcome] += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "running": self.running,
+            "runs": self.runs,
+            "next_run_at": _isoformat(self.next_run_at) if self.next_run_at and not self.running else None,
+            "last_run": self.last_run
+        }
+
+    def collect_metrics(self):
+        """
+        Expose the last run's coverage as Prometheus metric families, read at scrape time.
+        """
+        coverage = self.last_run["coverage"] if self.last_run else {}
+        yield ("trip_planner_warm_coverage_ratio", "gauge",
+               "Fraction of warm targets cached after the last warming run.",
+               [({"kind": kind}, counts["ratio"]) for kind, counts in coverage.items()])
+        yield ("trip_planner_warm_runs_total", "counter", "Completed cache warming runs.", [({}, self.runs)])
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from app.config import CIRCUIT_FAILURE_RATE, CIRCUIT_MIN_CALLS, CIRCUIT_WINDOW, CIRCUIT_OPEN_DURATION
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Every CircuitBreaker registers itself here so its state can be reported
+_registry: Dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(Exception):
+    """
+    A call was refused without being attempted because the dependency's circuit is open.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of calls to one upstream dependency and stops calling it
+    while it is failing.
+
+    Closed: calls go through, and outcomes from the last `window` seconds are
+    kept. Once at least `min_calls` were seen and `failure_rate` of them
+    failed, the circuit opens. Open: calls are refused with CircuitOpenError
+    for `open_duration` seconds. Half-open: one trial call is let through; its
+    success closes the circuit, its failure opens it again.
+
+    Health probes report outcomes with `probe=True`: they are never refused,
+    and a successful probe closes an open circuit straight away.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window: float = CIRCUIT_WINDOW,
+        open_duration: float = CIRCUIT_OPEN_DURATION
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_duration = open_duration
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.opened = 0
+        self.rejected = 0
+        _registry[name] = self
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at < self.open_duration:
+            return OPEN
+        return HALF_OPEN
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_duration - time.monotonic())
+
+    def is_open(self) -> bool:
+        """
+        Whether calls are currently being refused. Unlike check(), this does not
+        take the half-open trial, so callers can use it to skip optional work.
+        """
+        return self.state == OPEN
+
+    def raise_if_open(self):
+        """
+        Raise CircuitOpenError while calls are being refused, so a caller can
+        give up before starting work that needs the dependency.
+        """
+        if self.is_open():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def check(self):
+        """
+        Raise CircuitOpenError if a call may not be made now. In the half-open
+        state the first caller gets the trial call and later ones are refused.
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.name, self.retry_after() or 1.0)
+
+    def record_success(self, probe: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            self.last_success = now
+            self._trial_in_flight = False
+            if self._opened_at is not None:
+                if probe or self.state == HALF_OPEN:
+                    logger.info("Circuit for %s closed", self.name)
+                    self._opened_at = None
+                    self._outcomes.clear()
+                return
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self, probe: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            self.last_failure = now
+            self._trial_in_flight = False
+            if self._opened_at is not None:
+                if probe or self.state == HALF_OPEN:
+                    # Still failing: stay open for another full period
+                    self._opened_at = now
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                logger.warning(
+                    "Circuit for %s opened: %d of the last %d calls failed",
+                    self.name, failures, len(self._outcomes)
+                )
+                self._opened_at = now
+                self.opened += 1
+
+    def release(self):
+        """
+        Forget a call that ended without saying anything about the dependency (e.g. cancelled).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    @contextmanager
+    def guard(self, is_failure: Optional[Callable[[Exception], bool]] = None, probe: bool = False):
+        """
+        Check the circuit, run the block and record its outcome. Exceptions for
+        which `is_failure` returns False (the dependency answered, the request
+        was bad) are re-raised without counting against the dependency.
+        """
+        if not probe:
+            self.check()
+        try:
+            yield
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure(probe)
+            else:
+                self.release()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success(probe)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "retry_after": round(self.retry_after(), 1),
+            "recent_calls": calls,
+            "recent_failure_rate": round(failures / calls, 4) if calls else 0.0,
+            "times_opened": self.opened,
+            "rejected": self.rejected
+        }
+
+    def _prune(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in _registry.items()}
+
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def collect_circuit_metrics():
+    """
+    Expose circuit breaker state as Prometheus metric families, read at scrape time.
+    """
+    stats = breaker_stats()
+    yield ("trip_planner_circuit_state", "gauge", "Circuit state per dependency: 0 closed, 1 half-open, 2 open.",
+           [({"dependency": name}, _STATE_VALUES[s["state"]]) for name, s in stats.items()])
+    yield ("trip_planner_circuit_opened_total", "counter", "Times the circuit has opened.",
+           [({"dependency": name}, s["times_opened"]) for name, s in stats.items()])
+    yield ("trip_planner_circuit_rejected_total", "counter", "Calls refused while the circuit was open.",
+           [({"dependency": name}, s["rejected"]) for name, s in stats.items()])
+
+
+REGISTRY.register_collector(collect_circuit_metrics)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() by which the current request must finish, if it has a budget
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """
+    The request's latency budget ran out before the work finished. Unlike a
+    plain timeout, this says nothing about how the upstream is doing.
+    """
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """
+    Give the enclosed work (and tasks it creates) `seconds` to finish. A scope
+    inside another one can only shorten the deadline, never extend it.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(budget: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds left for a step: the smaller of its own `budget` and what is left
+    of the request's deadline. None when neither applies.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return budget
+    left = max(0.0, deadline - time.monotonic())
+    return left if budget is None else min(budget, left)
+
+
+async def detached(awaitable: Awaitable[T]) -> T:
+    """
+    Await without the request's deadline, for work that may outlive the
+    request, such as cache fills. Only works as a task's top-level coroutine:
+    the deadline is cleared in that task's copy of the context.
+    """
+    _deadline.set(None)
+    return await awaitable
+
+
+async def within(awaitable: Awaitable[T], budget: Optional[float] = None) -> T:
+    """
+    Await with a timeout of remaining(budget). Raises DeadlineExceeded when the
+    request deadline was what ran out, asyncio.TimeoutError when it was `budget`.
+    """
+    left = remaining()
+    timeout = remaining(budget)
+    started = time.monotonic()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if timeout is None or time.monotonic() - started < timeout:
+            # Raised by the work itself, e.g. a socket read timeout
+            raise
+        if left is not None and (budget is None or left <= budget):
+            raise DeadlineExceeded(f"request deadline reached after {timeout:.1f}s") from None
+        raise asyncio.TimeoutError(f"timed out after {timeout:.1f}s") from None
+
+
+async def within_or_default(awaitable: Awaitable[T], default: Any, budget: Optional[float] = None) -> Tuple[Any, str]:
+    """
+    Like within(), but return (`default`, "timeout") instead of raising on
+    either kind of timeout, and (result, "ok") when the work finished in time.
+    """
+    try:
+        return await within(awaitable, budget), "ok"
+    except asyncio.TimeoutError:
+        return default, "timeout"
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import CACHE_DIR, FLIGHTS_FILE, FLIGHTS_INDEX_THRESHOLD, FLIGHTS_RELOAD_INTERVAL
+from app.models.trip import normalize_text
+
+logger = logging.getLogger(__name__)
+
+RouteKey = Tuple[str, str]
+
+
+def parse_route(route: str, is_known: Optional[Callable[[str], bool]] = None) -> Optional[RouteKey]:
+    """
+    Split a flights.json route key into a normalized (origin, destination)
+    pair, or None if it cannot be split unambiguously. Keys are
+    "Origin|Destination", or "Origin-Destination" when neither name has a
+    hyphen. A hyphenated key with several possible splits ("Aix-en-Provence-Paris")
+    is split where both names are known to `is_known`.
+    """
+    if "|" in route:
+        origin, _, destination = route.partition("|")
+        splits = [(origin, destination)]
+    else:
+        parts = route.split("-")
+        splits = [("-".join(parts[:i]), "-".join(parts[i:])) for i in range(1, len(parts))]
+        if len(splits) > 1:
+            splits = [
+                (origin, destination) for origin, destination in splits
+                if is_known is not None and is_known(origin) and is_known(destination)
+            ]
+    if len(splits) != 1:
+        return None
+    origin, destination = (normalize_text(name) for name in splits[0])
+    return (origin, destination) if origin and destination else None
+
+
+class FlightStore:
+    """
+    Flight options by route, loaded from FLIGHTS_FILE once and reloaded when the
+    file changes.
+
+    Small files are held in a dict keyed by normalized (origin, destination),
+    plus a reverse index so a route listed one way also answers the return leg.
+    Files over FLIGHTS_INDEX_THRESHOLD bytes are compiled once per host into a
+    SQLite index under CACHE_DIR. Workers then look routes up by primary key in
+    the memory-mapped file instead of each parsing the JSON.
+
+    Changes are picked up on a background thread, and the new routes are
+    swapped in once loaded; lookups meanwhile use the previous ones.
+
+    Returned flight lists are shared; callers must not modify them.
+    """
+
+    def __init__(
+        self,
+        path: Path = FLIGHTS_FILE,
+        reload_interval: float = FLIGHTS_RELOAD_INTERVAL,
+        is_known: Optional[Callable[[str], bool]] = None
+    ):
+        self.path = Path(path)
+        self.index_path = CACHE_DIR / "flights.sqlite3"
+        self.reload_interval = reload_interval
+        # Resolves route keys whose city names contain hyphens; see parse_route
+        self.is_known = is_known
+        self._reloading = False
+        self._routes: Dict[RouteKey, List[Dict[str, Any]]] = {}
+        self._return_legs: Dict[RouteKey, List[Dict[str, Any]]] = {}
+        self._index: Optional[sqlite3.Connection] = None
+        self._index_lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.load()
+
+    def get(self, origin: str, destination: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the flights for a route, falling back to the reverse route, or None.
+        """
+        self._maybe_reload()
+        key = (normalize_text(origin), normalize_text(destination))
+        if self._index is not None:
+            return self._lookup_index(key)
+        flights = self._routes.get(key)
+        if flights is None:
+            flights = self._return_legs.get(key)
+        return flights
+
+    def routes(self) -> List[RouteKey]:
+        """
+        The routes listed in the flight data, as normalized (origin, destination)
+        pairs, without the return legs derived from them.
+        """
+        self._maybe_reload()
+        with self._index_lock:
+            if self._index is not None:
+                return self._index.execute("SELECT origin, destination FROM routes WHERE is_return = 0").fetchall()
+        return list(self._routes)
+
+    def __len__(self) -> int:
+        with self._index_lock:
+            if self._index is not None:
+                return self._index.execute("SELECT COUNT(*) FROM routes WHERE is_return = 0").fetchone()[0]
+        return len(self._routes)
+
+    def load(self):
+        """
+        (Re)load the route data, swapping in the new indexes in one step.
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            logger.warning("Flight data file not found: %s", self.path)
+            return
+        if stat.st_size > FLIGHTS_INDEX_THRESHOLD:
+            self._load_index(stat.st_mtime)
+        else:
+            self._load_dict()
+        self._mtime = stat.st_mtime
+        logger.info("Loaded %d flight routes from %s", len(self), self.path.name)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._reloading or now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            logger.info("Flight data changed on disk, reloading")
+            # Parsing (and indexing) a large file must not hold up the caller's event loop
+            self._reloading = True
+            threading.Thread(target=self._reload, name="flight-store-reload", daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logger.error("Error reloading flight data, keeping previous routes: %s", e)
+        finally:
+            self._reloading = False
+
+    def _parse_routes(self, data: Dict[str, Any]) -> Dict[RouteKey, List[Dict[str, Any]]]:
+        routes = {}
+        for route, flights in data.items():
+            key = parse_route(route, self.is_known)
+            if key is None:
+                logger.warning("Skipping flight route with an ambiguous key: %s", route)
+                continue
+            routes[key] = flights
+        return routes
+
+    def _load_dict(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        routes = self._parse_routes(data)
+        return_legs = {
+            (destination, origin): flights
+            for (origin, destination), flights in routes.items()
+            if (destination, origin) not in routes
+        }
+        self._routes, self._return_legs = routes, return_legs
+        self._close_index()
+
+    def _load_index(self, mtime: float):
+        if not self.index_path.exists() or self.index_path.stat().st_mtime < mtime:
+            self._build_index()
+        conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA mmap_size = 268435456")
+        with self._index_lock:
+            old, self._index = self._index, conn
+        if old is not None:
+            old.close()
+        self._routes, self._return_legs = {}, {}
+
+    def _build_index(self):
+        """
+        Compile the JSON file into the SQLite index. The file is written next to
+        the final path and renamed into place, so concurrent workers never see
+        a half-built index.
+        """
+        logger.info("Compiling flight index %s", self.index_path.name)
+        with open(self.path) as f:
+            data = json.load(f)
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        conn = sqlite3.connect(str(tmp_path))
+        conn.execute(
+            "CREATE TABLE routes (origin TEXT, destination TEXT, flights TEXT NOT NULL, "
+            "is_return INTEGER NOT NULL, PRIMARY KEY (origin, destination)) WITHOUT ROWID"
+        )
+        rows = [
+            (origin, destination, json.dumps(flights), 0)
+            for (origin, destination), flights in self._parse_routes(data).items()
+        ]
+        del data
+        conn.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)", rows)
+        # Reverse legs only where the return route is not listed itself
+        conn.executemany(
+            "INSERT OR IGNORE INTO routes VALUES (?, ?, ?, 1)",
+            ((destination, origin, flights) for origin, destination, flights, _ in rows)
+        )
+        conn.commit()
+        conn.close()
+        os.replace(tmp_path, self.index_path)
+
+    def _lookup_index(self, key: RouteKey) -> Optional[List[Dict[str, Any]]]:
+        with self._index_lock:
+            if self._index is None:
+                # Swapped for in-memory routes by a reload since the caller checked
+                return self._routes.get(key) or self._return_legs.get(key)
+            row = self._index.execute(
+                "SELECT flights FROM routes WHERE origin = ? AND destination = ?", key
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _close_index(self):
+        with self._index_lock:
+            old, self._index = self._index, None
+        if old is not None:
+            old.close()
+
+    def close(self):
+        self._close_index()
@@ -0,0 +1,109 @@
+import bisect
+import json
+import logging
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.config import GAZETTEER_FILE
+from app.models.trip import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def fold(value: str) -> str:
+    """
+    Gazetteer key for a place name: normalized like other free text, with
+    accents and punctuation dropped so "São Paulo" matches "sao paulo" and
+    "St. Petersburg" matches "st petersburg".
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    kept = "".join(c for c in decomposed if c.isalnum() or c.isspace())
+    return normalize_text(kept)
+
+
+class Gazetteer:
+    """
+    Known cities with coordinates, loaded from GAZETTEER_FILE once.
+
+    Cities are listed most prominent first, and that order ranks matches.
+    Lookups by name or alias (optionally qualified as "Name, Country") go
+    through a dict. Autocomplete uses a sorted array of keys, one per name,
+    alias and later word of a name (so "york" finds New York), searched with
+    bisect for the block of keys starting with the query.
+
+    Returned city dicts are shared; callers must not modify them.
+    """
+
+    def __init__(self, path: Path = GAZETTEER_FILE):
+        self.path = Path(path)
+        self._cities: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, List[int]] = {}
+        self._keys: List[str] = []
+        self._ids: List[int] = []
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            logger.warning("Gazetteer file not found: %s", self.path)
+            return
+
+        cities, by_name, prefix_keys = [], {}, set()
+        for city_id, entry in enumerate(entries):
+            cities.append({
+                "name": entry["name"],
+                "country": entry["country"],
+                "label": f"{entry['name']}, {entry['country']}",
+                "lat": entry["lat"],
+                "lng": entry["lng"]
+            })
+            for name in [entry["name"], *entry.get("aliases", [])]:
+                key = fold(name)
+                if not key:
+                    continue
+                ids = by_name.setdefault(key, [])
+                if city_id not in ids:
+                    ids.append(city_id)
+                words = key.split()
+                prefix_keys.update((" ".join(words[i:]), city_id) for i in range(len(words)))
+
+        ordered = sorted(prefix_keys)
+        self._cities, self._by_name = cities, by_name
+        self._keys = [key for key, _ in ordered]
+        self._ids = [city_id for _, city_id in ordered]
+        logger.info("Loaded %d cities from %s", len(cities), self.path.name)
+
+    def lookup(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the city a free-text location names, or None if it is unknown.
+        "Paris, France" must match the country as well; "Paris, Texas" is unknown.
+        """
+        name, _, qualifier = location.partition(",")
+        ids = self._by_name.get(fold(name))
+        if not ids:
+            return None
+        qualifier = fold(qualifier)
+        for city_id in ids:
+            city = self._cities[city_id]
+            if not qualifier or qualifier == fold(city["country"]):
+                return city
+        return None
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Cities with a name, alias or word of a name starting with `query`, most prominent first.
+        """
+        prefix = fold(query)
+        if not prefix:
+            return []
+        matches = set()
+        i = bisect.bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            matches.add(self._ids[i])
+            i += 1
+        return [self._cities[city_id] for city_id in sorted(matches)[:limit]]
@@ -1,12 +1,33 @@
 import google.generativeai as genai
+import asyncio
+import math
 import os
+from contextlib import aclosing
 from dotenv import load_dotenv
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from app.models.trip import TripRequest  # Import the TripRequest model
+from app.config import (
+    UPSTREAM_QPS, UPSTREAM_MAX_WAIT, GEMINI_TIMEOUT, GEMINI_STREAM_IDLE_TIMEOUT,
+    CHUNKED_ITINERARY_MIN_DAYS, ITINERARY_BLOCK_DAYS, ITINERARY_TOKENS_PER_DAY, OUTLINE_TOKENS_PER_BLOCK
+)
+from app.services.plan_parser import format_day, parse_trip_plan
+from app.services.rate_limiter import UpstreamGovernor, QuotaExceededError
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.metrics import span
+from app.services.deadline import DeadlineExceeded, within
 
 logger = logging.getLogger(__name__)
 
+
+def is_outage(error: Exception) -> bool:
+    """
+    Whether a failed call counts against Gemini's circuit. Running out of our
+    own quota or the request's deadline says nothing about Gemini.
+    """
+    return not isinstance(error, (QuotaExceededError, DeadlineExceeded))
+
+
 class GeminiService:
     def __init__(self):
         load_dotenv()
@@ -16,42 +37,231 @@ class GeminiService:
         genai.configure(api_key=self.api_key)
         # Adjust model name as needed
         self.model = genai.GenerativeModel('gemini-2.0-pro-exp-02-05')
+        self.governor = UpstreamGovernor("gemini", UPSTREAM_QPS["gemini"], max_wait=UPSTREAM_MAX_WAIT)
+        self.breaker = CircuitBreaker("gemini")
+
+    async def _generate(self, prompt: str, stage: str, max_output_tokens: Optional[int] = None) -> str:
+        kwargs = {}
+        if max_output_tokens:
+            kwargs["generation_config"] = {"max_output_tokens": max_output_tokens}
+        with self.breaker.guard(is_outage):
+            await self.governor.acquire()
+            with span(stage):
+                response = await within(self.model.generate_content_async(prompt, **kwargs), GEMINI_TIMEOUT)
+        if not response or not response.text:
+            raise ValueError("Empty response from Gemini")
+        return response.text
+
+    async def generate_itinerary(self, trip_request: TripRequest) -> str:
+        """
+        Generate the personalized day-by-day itinerary for a trip using Gemini.
+        Long trips are generated in blocks of days; see _itinerary_blocks.
+        """
+        try:
+            blocks = self._day_blocks(trip_request.duration or 7)
+            if len(blocks) > 1:
+                texts = [text async for text in self._itinerary_blocks(trip_request, blocks)]
+                return "#ITINERARY\n" + "\n\n".join(texts)
+            return await self._generate(self._create_itinerary_prompt(trip_request), "gemini_itinerary")
+        except Exception as e:
+            logger.error("Error generating itinerary: %s", e)
+            raise
+
+    async def generate_destination_guide(self, destination: str, travel_month: str) -> str:
+        """
+        Generate the overview and practical information for a destination in a
+        given month. It does not depend on who is travelling, so it can be shared.
+        """
+        try:
+            return await self._generate(self._create_guide_prompt(destination, travel_month), "gemini_guide")
+        except Exception as e:
+            logger.error("Error generating destination guide: %s", e)
+            raise
 
-    async def generate_trip_plan(self, trip_request: TripRequest) -> str:
+    async def stream_itinerary(self, trip_request: TripRequest) -> AsyncIterator[str]:
         """
-        Generate a detailed trip plan using Gemini.
+        Generate the itinerary with Gemini streaming, yielding text as it is produced.
+        Closing the iterator stops reading from Gemini. Fails with a timeout if
+        the stream does not start within GEMINI_TIMEOUT or stalls for longer
+        than GEMINI_STREAM_IDLE_TIMEOUT.
         """
         try:
-            prompt = self._create_prompt(trip_request)
-            response = self.model.generate_content(prompt)
-            if not response or not response.text:
-                raise ValueError("Empty response from Gemini")
-            return response.text
+            blocks = self._day_blocks(trip_request.duration or 7)
+            if len(blocks) > 1:
+                # Blocks are generated concurrently and each arrives whole, in day order
+                yield "#ITINERARY\n"
+                async with aclosing(self._itinerary_blocks(trip_request, blocks)) as texts:
+                    async for text in texts:
+                        yield text + "\n\n"
+                return
+            prompt = self._create_itinerary_prompt(trip_request)
+            with self.breaker.guard(is_outage):
+                await self.governor.acquire()
+                with span("gemini_stream"):
+                    response = await within(self.model.generate_content_async(prompt, stream=True), GEMINI_TIMEOUT)
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await within(chunks.__anext__(), GEMINI_STREAM_IDLE_TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunks without text parts (e.g. safety metadata only)
+                            continue
+                        if text:
+                            yield text
         except Exception as e:
-            logger.error(f"Error generating trip plan: {str(e)}")
+            logger.error("Error streaming itinerary: %s", e)
             raise
 
-    def _create_prompt(self, trip_request: TripRequest) -> str:
+    async def _itinerary_blocks(
+        self,
+        trip_request: TripRequest,
+        blocks: List[Tuple[int, int]]
+    ) -> AsyncIterator[str]:
         """
-        Create a structured prompt for the AI to generate the travel plan.
+        Generate a long trip's itinerary in parallel: first a short outline of
+        where each block of days is spent, then every block at once, each
+        keeping to its part of the outline with an output budget sized to its
+        days. Yields the blocks' itinerary text in day order. There are no more
+        blocks than the governor's burst, so while Gemini's quota is otherwise
+        idle the wall-clock time is about that of the outline plus one block.
+        """
+        outline = await self._generate(
+            self._create_outline_prompt(trip_request, blocks),
+            "gemini_outline",
+            max_output_tokens=OUTLINE_TOKENS_PER_BLOCK * len(blocks)
+        )
+        outline = "\n".join(line for line in outline.strip().splitlines() if not line.lstrip().startswith("#"))
+        tasks = [
+            asyncio.create_task(self._generate(
+                self._create_block_prompt(trip_request, outline, first, last),
+                "gemini_itinerary_block",
+                max_output_tokens=ITINERARY_TOKENS_PER_DAY * (last - first + 1)
+            ))
+            for first, last in blocks
+        ]
+        try:
+            for (first, last), task in zip(blocks, tasks):
+                yield self._stitch_block(await task, first, last)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _day_blocks(self, duration: int) -> List[Tuple[int, int]]:
+        """
+        Split a trip into (first, last) day ranges generated in parallel: a
+        single range below CHUNKED_ITINERARY_MIN_DAYS, otherwise blocks of at
+        least ITINERARY_BLOCK_DAYS, no more of them than can start together.
+        The governor's bucket refills while the outline is generated, so its
+        burst is how many block calls start without queueing for quota.
+        """
+        if duration < CHUNKED_ITINERARY_MIN_DAYS:
+            return [(1, duration)]
+        parallel = min(math.ceil(duration / ITINERARY_BLOCK_DAYS), max(1, int(self.governor.burst)))
+        size = math.ceil(duration / parallel)
+        return [(first, min(first + size - 1, duration)) for first in range(1, duration + 1, size)]
+
+    @staticmethod
+    def _stitch_block(text: str, first: int, last: int) -> str:
+        """
+        Reformat a block's days uniformly and number them from `first`, in case
+        the model restarted at Day 1 or went past its range.
+        """
+        plan = parse_trip_plan(text)
+        if not plan.days:
+            return plan.itinerary or text.strip()
+        days = [
+            day.model_copy(update={"day": first + offset})
+            for offset, day in enumerate(plan.days[:last - first + 1])
+        ]
+        return "\n\n".join(format_day(day) for day in days)
+
+    async def probe(self):
+        """
+        Cheap authenticated round trip for health checks: counting tokens is not billed.
+        """
+        await self.model.count_tokens_async("ping")
+
+    def _create_itinerary_prompt(self, trip_request: TripRequest) -> str:
+        """
+        Create the prompt for the personalized part of the plan: the itinerary.
         """
         selected_interests = [k for k, v in trip_request.interests.items() if v]
         duration = trip_request.duration or 7
 
         return f"""
-        Create a detailed travel plan for a {duration}-day trip from {trip_request.fromLocation} 
+        Create a day-by-day itinerary for a {duration}-day trip from {trip_request.fromLocation} 
         to {trip_request.destination}.
         This trip is for {trip_request.travelers} travelers in {trip_request.travelDate}.
         The travelers are interested in: {', '.join(selected_interests)}.
 
-        Please provide the response in the following structured format:
+        Please provide the response in the following structured format, with no other sections:
 
-        #OVERVIEW
-        (An introduction about {trip_request.destination}, best time to visit, local culture, etc.)
+        #ITINERARY
+        (A day-by-day breakdown with morning, afternoon, and evening suggestions.
+        Start each day with a "Day N: Title" line.)
+        """
+
+    def _create_outline_prompt(self, trip_request: TripRequest, blocks: List[Tuple[int, int]]) -> str:
+        """
+        Create the prompt for a long trip's outline, one line per block of days.
+        """
+        selected_interests = [k for k, v in trip_request.interests.items() if v]
+        ranges = ", ".join(f"Days {first}-{last}" for first, last in blocks)
+
+        return f"""
+        Outline a {trip_request.duration}-day trip from {trip_request.fromLocation} 
+        to {trip_request.destination}.
+        This trip is for {trip_request.travelers} travelers in {trip_request.travelDate}.
+        The travelers are interested in: {', '.join(selected_interests)}.
+
+        Split the trip into these day ranges: {ranges}.
+        Please provide the response in the following structured format, with no other sections:
+
+        #OUTLINE
+        (One line per day range, e.g. "Days 1-5: Base city or region - main themes and highlights".
+        Plan travel between regions so the ranges connect.)
+        """
+
+    def _create_block_prompt(self, trip_request: TripRequest, outline: str, first: int, last: int) -> str:
+        """
+        Create the prompt for days `first` to `last` of a long trip's itinerary.
+        """
+        selected_interests = [k for k, v in trip_request.interests.items() if v]
+
+        return f"""
+        Create days {first} to {last} of a day-by-day itinerary for a {trip_request.duration}-day trip 
+        from {trip_request.fromLocation} to {trip_request.destination}.
+        This trip is for {trip_request.travelers} travelers in {trip_request.travelDate}.
+        The travelers are interested in: {', '.join(selected_interests)}.
+
+        The whole trip follows this outline. Cover only days {first} to {last}, and do not repeat
+        places planned for other days:
+        {outline}
+
+        Please provide the response in the following structured format, with no other sections:
 
         #ITINERARY
-        (A day-by-day breakdown with morning, afternoon, and evening suggestions.)
+        (A day-by-day breakdown of days {first} to {last} with morning, afternoon, and evening suggestions.
+        Start each day with a "Day N: Title" line, numbering from Day {first}.)
+        """
+
+    def _create_guide_prompt(self, destination: str, travel_month: str) -> str:
+        """
+        Create the prompt for the destination-level parts of the plan, which are
+        the same for every traveler visiting in that month.
+        """
+        return f"""
+        Write a travel guide for visitors to {destination} in {travel_month}.
+
+        Please provide the response in the following structured format, with no other sections:
+
+        #OVERVIEW
+        (An introduction about {destination}, what it is like to visit in {travel_month}, local culture, etc.)
 
         #PRACTICAL_INFO
-        (Recommendations about where to stay, budget, local tips, etc.)
+        (Recommendations about where to stay, budget, getting around, local tips, etc.)
         """
@@ -1,165 +1,384 @@
-import googlemaps
 import os
+import asyncio
 from dotenv import load_dotenv
 import logging
-from typing import Dict, List, Any
-import requests
+from typing import Dict, List, Any, Optional
 from datetime import datetime
+from app.config import (
+    API_PREFIX, GOOGLE_MAPS_BASE_URL, MAPS_READ_TIMEOUT,
+    GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_NEGATIVE_TTL,
+    PLACE_DETAILS_CACHE_SIZE, PLACE_DETAILS_CACHE_TTL, HOTEL_DETAILS_DEADLINE,
+    UPSTREAM_QPS, UPSTREAM_MAX_WAIT, HEALTH_PROBE_LOCATION, MAPS_CALL_TIMEOUT
+)
+from app.models.trip import normalize_text
+from app.services.cache import TieredCache
+from app.services.spatial_cache import SpatialCache
+from app.services.rate_limiter import UpstreamGovernor, QuotaExceededError
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.flight_store import FlightStore
+from app.services.gazetteer import Gazetteer
+from app.services.http_client import HttpClient, UpstreamHTTPError
+from app.services.metrics import span
+from app.services.deadline import DeadlineExceeded, detached, remaining, within
+from app.services.hedging import Hedger
 
 logger = logging.getLogger(__name__)
 
+# Idempotent reads that are hedged when slow
+HEDGED_METHODS = ("geocode", "places_nearby", "place")
+
+# Used for routes missing from the flight data
+DEFAULT_ROUTE = {
+    'duration': '3h 00m',
+    'airlines': ['Major Airline', 'Budget Carrier'],
+    'base_price': 400
+}
+
+HOTEL_DETAIL_FIELDS = [
+    'name', 'rating', 'formatted_address',
+    'price_level', 'website', 'formatted_phone_number',
+    'reviews', 'opening_hours', 'photo'
+]
+
+
+class MapsApiError(Exception):
+    """
+    A Maps web service answered with an error status such as OVER_QUERY_LIMIT or REQUEST_DENIED.
+    """
+
+    def __init__(self, status: str, message: Optional[str] = None):
+        super().__init__(f"{status}: {message}" if message else status)
+        self.status = status
+
+
+def is_outage(error: Exception) -> bool:
+    """
+    Whether a failed call counts against the Maps circuit. Bad requests and
+    running out of our own quota or the request's deadline say nothing about
+    whether Maps is up.
+    """
+    if isinstance(error, MapsApiError):
+        return error.status not in ("INVALID_REQUEST", "NOT_FOUND")
+    if isinstance(error, UpstreamHTTPError):
+        return error.status >= 500 or error.status == 429
+    return not isinstance(error, (QuotaExceededError, DeadlineExceeded))
+
+
+def normalize_location(location: str) -> str:
+    """
+    Normalize a free-text location so that "  new york" and "New York" share a cache entry.
+    """
+    return normalize_text(location).strip(" ,")
+
+
+def photo_url(photo_reference: str) -> str:
+    """
+    URL of a Places photo on our photo proxy, so the API key never reaches clients.
+    """
+    return f"{API_PREFIX}/photos/{photo_reference}"
+
+
 class GoogleMapsService:
-    def __init__(self):
+    def __init__(self, http_client: HttpClient):
         load_dotenv()
         self.api_key = os.getenv("GOOGLE_MAPS_API_KEY")
         if not self.api_key:
             raise ValueError("GOOGLE_MAPS_API_KEY not found in environment variables")
-        self.client = googlemaps.Client(key=self.api_key)
+        # Maps web service calls go through the application's pooled async HTTP client
+        self.http = http_client
+        self.governor = UpstreamGovernor(
+            "google_maps", UPSTREAM_QPS["google_maps"], max_wait=UPSTREAM_MAX_WAIT
+        )
+        self.breaker = CircuitBreaker("google_maps")
+        self.hedgers = {method: Hedger(f"maps_{method}") for method in HEDGED_METHODS}
+        # Resolved coordinates live in memory for CACHE_TIMEOUT and on disk much longer.
+        # Lookups that found nothing are kept apart with a short TTL so they get retried.
+        self._geocode_cache = TieredCache(
+            "geocode",
+            maxsize=GEOCODE_CACHE_SIZE,
+            disk_ttl=GEOCODE_CACHE_TTL
+        )
+        self._place_details_cache = TieredCache(
+            "place_details",
+            maxsize=PLACE_DETAILS_CACHE_SIZE,
+            disk_ttl=PLACE_DETAILS_CACHE_TTL
+        )
+        # Nearby searches, shared between destinations whose search circles overlap
+        self._nearby_cache = SpatialCache("places_nearby")
+        self._background_tasks = set()
+        # Known cities are resolved from local data without a Geocoding call
+        self.gazetteer = Gazetteer()
+        self.flight_store = FlightStore(is_known=lambda name: self.gazetteer.lookup(name) is not None)
+        self._geocode_misses = TieredCache(
+            "geocode_negative",
+            maxsize=GEOCODE_CACHE_SIZE,
+            ttl=GEOCODE_NEGATIVE_TTL,
+            persistent=False
+        )
         logger.info("Google Maps Service initialized")
 
+    async def _request(self, method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a Maps web service endpoint and return its JSON response. Fails
+        fast with CircuitOpenError while Maps is down, then waits for Maps
+        quota. The call is timed as the "maps_<method>" stage.
+
+        Calls are bounded by MAPS_CALL_TIMEOUT and the request's deadline, and
+        HEDGED_METHODS get a duplicate call when they are slower than usual.
+        """
+        with self.breaker.guard(is_outage):
+            hedger = self.hedgers.get(method)
+            call = lambda: self._call(method, path, params)
+            return await within(hedger.run(call) if hedger else call(), MAPS_CALL_TIMEOUT)
+
+    async def probe(self):
+        """
+        Geocode HEALTH_PROBE_LOCATION directly, without the gazetteer or caches, for health checks.
+        """
+        await self._call("geocode", "geocode/json", {"address": HEALTH_PROBE_LOCATION})
+
+    async def _call(self, method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        await self.governor.acquire()
+        with span(f"maps_{method}"):
+            data = await self.http.get_json(
+                f"{GOOGLE_MAPS_BASE_URL}/{path}",
+                {**params, "key": self.api_key},
+                read_timeout=MAPS_READ_TIMEOUT
+            )
+        status = data.get("status")
+        if status not in ("OK", "ZERO_RESULTS"):
+            raise MapsApiError(status, data.get("error_message"))
+        return data
+
+    def close(self):
+        """
+        Release the cache files used by the service. The HTTP client is closed by its owner.
+        """
+        self._geocode_cache.close()
+        self._place_details_cache.close()
+        self.flight_store.close()
+
     async def get_coordinates(self, location: str) -> Dict[str, float]:
         """
-        Get coordinates for a location using Google Maps Geocoding API.
+        Get coordinates for a location. Cities in the gazetteer are answered
+        locally; anything else goes to the Google Maps Geocoding API, with
+        results cached by normalized location name.
         """
+        city = self.gazetteer.lookup(location)
+        if city is not None:
+            return {"lat": city["lat"], "lng": city["lng"]}
+        key = normalize_location(location)
+        cached = await self._geocode_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        if await self._geocode_misses.get(key) is not None:
+            return {"lat": 0, "lng": 0}
         try:
-            logger.info(f"Getting coordinates for {location}")
-            geocode_result = self.client.geocode(location)
+            logger.info("Getting coordinates for %s", location)
+            geocode_result = (await self._request("geocode", "geocode/json", {"address": location}))["results"]
             if geocode_result and len(geocode_result) > 0:
                 loc = geocode_result[0]['geometry']['location']
-                return {
+                coordinates = {
                     "lat": loc['lat'],
                     "lng": loc['lng']
                 }
+                self._geocode_cache.set(key, coordinates)
+                return dict(coordinates)
             else:
-                logger.warning(f"No coordinates found for {location}")
+                logger.warning("No coordinates found for %s", location)
+                self._geocode_misses.set(key, True)
                 return {"lat": 0, "lng": 0}
         except Exception as e:
-            logger.error(f"Error getting coordinates for {location}: {str(e)}")
+            logger.error("Error getting coordinates for %s: %s", location, e)
             return {"lat": 0, "lng": 0}
 
-    async def get_hotels(self, location: str) -> Dict[str, Any]:
+    async def get_hotels(self, location: str, coordinates: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
         """
-        Get hotel information using Google Places API.
+        Get hotel information using Google Places API. Pass `coordinates` when the
+        location has already been geocoded to skip the lookup.
+
+        Place details are fetched concurrently. Hotels whose details are not back
+        within HOTEL_DETAILS_DEADLINE are returned with the nearby-search summary
+        only and flagged `partial`; their lookups finish in the background and
+        land in the place details cache for the next request.
+
+        While the Maps circuit is open no hotels are looked up and the result is flagged `partial`.
         """
+        if self.breaker.is_open():
+            logger.warning("Google Maps circuit is open, skipping hotels in %s", location)
+            return {"hotels": [], "partial": True}
         try:
-            logger.info(f"Getting hotels in {location}")
-            coordinates = await self.get_coordinates(location)
-            places_result = self.client.places_nearby(
-                location=coordinates,
-                radius=5000,  # 5km radius
-                type='lodging',
-                keyword='hotel'
-            )
+            logger.info("Getting hotels in %s", location)
+            if coordinates is None:
+                coordinates = await self.get_coordinates(location)
+            places = (await self._nearby_search(coordinates, "lodging", "hotel"))[:8]
+            # Detached from the request deadline so that late lookups can still fill the cache
+            details_tasks = [
+                asyncio.create_task(detached(self._get_place_details(place['place_id'])))
+                for place in places
+            ]
+            if details_tasks:
+                with span("hotel_details"):
+                    try:
+                        await asyncio.wait(details_tasks, timeout=remaining(HOTEL_DETAILS_DEADLINE))
+                    except asyncio.CancelledError:
+                        for task in details_tasks:
+                            self._track_background_task(task)
+                        raise
+
             hotels = []
-            for place in places_result.get('results', [])[:8]:
-                try:
-                    details = self.client.place(
-                        place['place_id'],
-                        fields=[
-                            'name', 'rating', 'formatted_address',
-                            'price_level', 'website', 'formatted_phone_number',
-                            'reviews', 'opening_hours', 'photo'
-                        ]
-                    )['result']
-                    # Collect up to 3 photos
-                    photo_refs = place.get('photos', [])
-                    photos = []
-                    for photo in photo_refs[:3]:
-                        if 'photo_reference' in photo:
-                            photo_url = (
-                                f"https://maps.googleapis.com/maps/api/place/photo"
-                                f"?maxwidth=800&photoreference={photo['photo_reference']}"
-                                f"&key={self.api_key}"
-                            )
-                            photos.append(photo_url)
-
-                    hotels.append({
-                        "name": details.get('name', 'Unknown Hotel'),
-                        "rating": details.get('rating', 'N/A'),
-                        "address": details.get('formatted_address', 'Address not available'),
-                        "price_level": "€" * (details.get('price_level', 1) if details.get('price_level') else 1),
-                        "phone": details.get('formatted_phone_number', 'Phone not available'),
-                        "website": details.get('website', ''),
-                        "photos": photos,
-                        "reviews": details.get('reviews', [])[:3],
-                        "opening_hours": details.get('opening_hours', {}).get('weekday_text', [])
-                    })
-                except Exception as e:
-                    logger.error(f"Error processing hotel: {str(e)}")
-                    continue
-            return {"hotels": hotels}
+            pending = 0
+            for place, task in zip(places, details_tasks):
+                if not task.done():
+                    pending += 1
+                    self._track_background_task(task)
+                    hotels.append(self._build_hotel(place, {}, partial=True))
+                elif task.exception() is not None:
+                    logger.error("Error processing hotel: %s", task.exception())
+                else:
+                    hotels.append(self._build_hotel(place, task.result()))
+            if pending:
+                logger.warning("%d hotel detail lookup(s) in %s missed the deadline", pending, location)
+            return {"hotels": hotels, "partial": pending > 0}
         except Exception as e:
-            logger.error(f"Error getting hotels: {str(e)}")
-            return {"hotels": []}
+            logger.error("Error getting hotels: %s", e)
+            return {"hotels": [], "partial": False}
 
-    async def get_places_photos(self, location: str) -> List[str]:
+    async def _nearby_search(
+        self,
+        coordinates: Dict[str, float],
+        place_type: str,
+        keyword: str,
+        radius: int = 5000
+    ) -> List[Dict[str, Any]]:
+        """
+        Places nearby search, answered from the spatial cache when earlier
+        searches of the same type and keyword already cover the circle.
+        """
+        lat, lng = coordinates["lat"], coordinates["lng"]
+        # (0, 0) is what a failed geocode returns, not a real destination
+        cacheable = (lat, lng) != (0, 0)
+        kind = f"{place_type}:{keyword}"
+        if cacheable:
+            places = self._nearby_cache.get(lat, lng, radius, kind)
+            if places is not None:
+                return places
+        places = (await self._request("places_nearby", "place/nearbysearch/json", {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "type": place_type,
+            "keyword": keyword
+        })).get("results", [])
+        if cacheable:
+            self._nearby_cache.put(lat, lng, radius, kind, places)
+        return places
+
+    async def _get_place_details(self, place_id: str) -> Dict[str, Any]:
+        """
+        Fetch the details shown for a hotel, served from the place details cache when possible.
+        """
+        cached = await self._place_details_cache.get(place_id)
+        if cached is not None:
+            return cached
+        details = (await self._request("place", "place/details/json", {
+            "place_id": place_id,
+            "fields": ",".join(HOTEL_DETAIL_FIELDS)
+        }))['result']
+        self._place_details_cache.set(place_id, details)
+        return details
+
+    def _track_background_task(self, task: asyncio.Task):
+        # Keep a reference so the task is not garbage collected before it finishes
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        # Retrieve the outcome so a late failure is not reported as never retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def _build_hotel(self, place: Dict[str, Any], details: Dict[str, Any], partial: bool = False) -> Dict[str, Any]:
+        """
+        Shape a hotel entry from its nearby-search result, overlaid with place details.
+        """
+        # Collect up to 3 photos
+        photo_refs = place.get('photos', [])
+        photos = []
+        for photo in photo_refs[:3]:
+            if 'photo_reference' in photo:
+                photos.append(photo_url(photo['photo_reference']))
+
+        price_level = details.get('price_level', place.get('price_level'))
+        return {
+            "name": details.get('name', place.get('name', 'Unknown Hotel')),
+            "rating": details.get('rating', place.get('rating', 'N/A')),
+            "address": details.get('formatted_address', place.get('vicinity', 'Address not available')),
+            "price_level": "€" * (price_level if price_level else 1),
+            "phone": details.get('formatted_phone_number', 'Phone not available'),
+            "website": details.get('website', ''),
+            "photos": photos,
+            "reviews": details.get('reviews', [])[:3],
+            "opening_hours": details.get('opening_hours', {}).get('weekday_text', []),
+            "partial": partial
+        }
+
+    async def get_places_photos(self, location: str, coordinates: Optional[Dict[str, float]] = None) -> List[str]:
         """
         Get photos of popular places in the destination (tourist attractions).
+        Pass `coordinates` when the location has already been geocoded.
+        Returns no photos while the Maps circuit is open.
         """
+        if self.breaker.is_open():
+            logger.warning("Google Maps circuit is open, skipping photos for %s", location)
+            return []
         try:
-            logger.info(f"Fetching photos for popular places in {location}")
-            coordinates = await self.get_coordinates(location)
-            places_result = self.client.places_nearby(
-                location=coordinates,
-                radius=5000,
-                type='tourist_attraction',
-                keyword='landmarks'
-            )
+            logger.info("Fetching photos for popular places in %s", location)
+            if coordinates is None:
+                coordinates = await self.get_coordinates(location)
+            places = await self._nearby_search(coordinates, "tourist_attraction", "landmarks")
             photos = []
-            if 'results' in places_result:
-                # Go through up to 15 places
-                for place in places_result['results'][:15]:
-                    # Each place might have a 'photos' key
-                    place_photos = place.get('photos', [])
-                    if len(place_photos) > 0:
-                        photo_ref = place_photos[0].get('photo_reference')
-                        if photo_ref:
-                            photo_url = (
-                                f"https://maps.googleapis.com/maps/api/place/photo?"
-                                f"maxwidth=800&photoreference={photo_ref}"
-                                f"&key={self.api_key}"
-                            )
-                            photos.append(photo_url)
+            # Go through up to 15 places
+            for place in places[:15]:
+                # Each place might have a 'photos' key
+                place_photos = place.get('photos', [])
+                if len(place_photos) > 0:
+                    photo_ref = place_photos[0].get('photo_reference')
+                    if photo_ref:
+                        photos.append(photo_url(photo_ref))
 
             if not photos:
-                logger.warning(f"No photos found for {location}")
+                logger.warning("No photos found for %s", location)
             else:
-                logger.info(f"Fetched {len(photos)} photo(s) for {location}")
+                logger.info("Fetched %d photo(s) for %s", len(photos), location)
 
             return photos
 
         except Exception as e:
-            logger.error(f"Error getting photos: {str(e)}")
+            logger.error("Error getting photos: %s", e)
             return []
 
+    async def fetch_photo(self, photo_reference: str, max_width: int) -> bytes:
+        """
+        Download a Places photo, following the redirect to the image itself.
+        """
+        with self.breaker.guard(is_outage):
+            await self.governor.acquire()
+            with span("maps_places_photo"):
+                return await within(self.http.get_bytes(
+                    f"{GOOGLE_MAPS_BASE_URL}/place/photo",
+                    {"photoreference": photo_reference, "maxwidth": max_width, "key": self.api_key}
+                ), MAPS_CALL_TIMEOUT)
+
     def get_realistic_flights(self, from_location: str, to_location: str) -> Dict[str, Any]:
         """
-        Generate simplistic flight data for demonstration. In production,
-        you'd integrate with a real flight API or database.
+        Look up flights for the route in the flight data, falling back to
+        simplistic generated flights for unknown routes. In production,
+        you'd integrate with a real flight API.
         """
         try:
-            # Predefined route info
-            route_info = {
-                ('Bengaluru', 'Delhi'): {
-                    'duration': '2h 45m',
-                    'airlines': ['Air India', 'IndiGo'],
-                    'base_price': 350
-                },
-                ('Delhi', 'Mumbai'): {
-                    'duration': '2h 15m',
-                    'airlines': ['IndiGo', 'Vistara'],
-                    'base_price': 300
-                },
-                # Add more routes as needed
-            }
+            flights = self.flight_store.get(from_location, to_location)
+            if flights:
+                return {"available_flights": flights}
 
+            route_data = DEFAULT_ROUTE
             flights = []
-            route = (from_location, to_location)
-            route_data = route_info.get(route, {
-                'duration': '3h 00m',
-                'airlines': ['Major Airline', 'Budget Carrier'],
-                'base_price': 400
-            })
 
             # Morning flight
             flights.append({
@@ -187,5 +406,5 @@ class GoogleMapsService:
 
             return {"available_flights": flights}
         except Exception as e:
-            logger.error(f"Error generating flight data: {str(e)}")
+            logger.error("Error generating flight data: %s", e)
             return {"available_flights": []}
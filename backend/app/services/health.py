@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT
+from app.services.circuit_breaker import CLOSED, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Keeps an up-to-date view of upstream health so /health can answer from
+    memory instead of calling Google on every probe.
+
+    Each dependency has a circuit breaker, fed by real traffic, and a probe.
+    Every `interval` seconds a background task probes the dependencies that
+    have not had a successful call in that time, or whose circuit is not
+    closed, so an idle pod still notices outages and an open circuit closes
+    as soon as the dependency is back.
+    """
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Tuple[CircuitBreaker, Callable[[], Awaitable[Any]]]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_check(self, name: str, breaker: CircuitBreaker, probe: Callable[[], Awaitable[Any]]):
+        self._checks[name] = (breaker, probe)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error("Error probing dependencies: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self, force: bool = False):
+        now = time.monotonic()
+        due: List[str] = [
+            name for name, (breaker, _) in self._checks.items()
+            if force or breaker.state != CLOSED
+            or breaker.last_success is None or now - breaker.last_success >= self.interval
+        ]
+        await asyncio.gather(*(self._probe(name) for name in due))
+
+    async def _probe(self, name: str):
+        breaker, probe = self._checks[name]
+        started = time.perf_counter()
+        error = None
+        try:
+            with breaker.guard(probe=True):
+                await asyncio.wait_for(probe(), self.timeout)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            logger.warning("Health probe for %s failed: %s", name, error)
+        self._results[name] = {
+            "ok": error is None,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds")
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Overall status and, per dependency, its circuit state and last probe result.
+        """
+        dependencies = {
+            name: {**breaker.stats(), "last_probe": self._results.get(name)}
+            for name, (breaker, _) in self._checks.items()
+        }
+        healthy = all(dependency["state"] == CLOSED for dependency in dependencies.values())
+        return {"status": "healthy" if healthy else "degraded", "dependencies": dependencies}
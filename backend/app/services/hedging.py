@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from app.config import (
+    HEDGE_QUANTILE, HEDGE_MIN_DELAY, HEDGE_DEFAULT_DELAY, HEDGE_MIN_SAMPLES,
+    HEDGE_SAMPLE_SIZE, HEDGE_MAX_RATIO
+)
+from app.services.metrics import HEDGES_SENT, HEDGES_WON
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """
+    Recent latencies of one kind of call, for estimating a quantile. The
+    quantile is recomputed every few samples rather than on every read.
+    """
+
+    def __init__(self, quantile: float = HEDGE_QUANTILE, size: int = HEDGE_SAMPLE_SIZE):
+        self.quantile = quantile
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._estimate: Optional[float] = None
+        self._since_estimate = 0
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_estimate += 1
+        if self._estimate is None or self._since_estimate >= 10:
+            self._since_estimate = 0
+            if len(self._samples) >= HEDGE_MIN_SAMPLES:
+                ordered = sorted(self._samples)
+                self._estimate = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+    @property
+    def estimate(self) -> Optional[float]:
+        return self._estimate
+
+
+class Hedger:
+    """
+    Runs an idempotent call, and if it has not answered after the call's p95
+    latency, fires a duplicate and takes whichever answers first; the other
+    is cancelled. Only the slowest ~5% of calls are duplicated, which cuts
+    the tail they cause for a few percent more upstream requests.
+
+    Hedges are also capped at `max_ratio` of calls, so that a slow upstream
+    does not get its load doubled.
+    """
+
+    def __init__(self, name: str, max_ratio: float = HEDGE_MAX_RATIO):
+        self.name = name
+        self.max_ratio = max_ratio
+        self.latency = LatencyTracker()
+        self._credit = 1.0
+        self.calls = 0
+        self.hedged = 0
+        self.won = 0
+
+    def delay(self) -> float:
+        estimate = self.latency.estimate
+        return HEDGE_DEFAULT_DELAY if estimate is None else max(HEDGE_MIN_DELAY, estimate)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        # Each call earns a fraction of a hedge, up to a small burst
+        self._credit = min(10.0, self._credit + self.max_ratio)
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(call())
+        backup = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.delay())
+            if done or self._credit < 1.0:
+                result = await primary
+                self.latency.observe(time.perf_counter() - started)
+                return result
+
+            self._credit -= 1.0
+            self.hedged += 1
+            HEDGES_SENT.inc(stage=self.name)
+            backup = asyncio.ensure_future(call())
+            pending = {primary, backup}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                winner = succeeded[0] if succeeded else None
+                if winner is not None:
+                    # The primary took at least this long, even if it lost
+                    self.latency.observe(time.perf_counter() - started)
+                    if winner is backup:
+                        self.won += 1
+                        HEDGES_WON.inc(stage=self.name)
+                    return winner.result()
+                if not pending:
+                    # Both failed: report the original call's error
+                    return primary.result()
+        finally:
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        estimate = self.latency.estimate
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_won": self.won,
+            "delay_ms": round(self.delay() * 1000, 1),
+            "p95_ms": None if estimate is None else round(estimate * 1000, 1)
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+import aiohttp
+from app.config import (
+    HTTP_POOL_SIZE, HTTP_POOL_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Worth retrying: the request never reached the upstream, or it failed on its side
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class UpstreamHTTPError(Exception):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} from {url}")
+        self.status = status
+
+
+class HttpClient:
+    """
+    Application-wide aiohttp session for outbound calls. Connections are kept
+    alive and pooled per host, and DNS answers are cached, so repeated calls
+    to the same upstream skip the TCP and TLS handshakes.
+
+    Started on FastAPI startup and closed on shutdown. If it is used before
+    start(), the session is created on first use.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        pool_per_host: int = HTTP_POOL_PER_HOST,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT
+    ):
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                raise_for_status=False
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       read_timeout: Optional[float] = None) -> Any:
+        """
+        GET a JSON document, retrying transient failures.
+        """
+        return await self._get(url, params, read_timeout, lambda response: response.json(content_type=None))
+
+    async def get_bytes(self, url: str, params: Optional[Dict[str, Any]] = None,
+                        read_timeout: Optional[float] = None) -> bytes:
+        """
+        GET a body as bytes, following redirects and retrying transient failures.
+        """
+        return await self._get(url, params, read_timeout, lambda response: response.read())
+
+    async def _get(self, url, params, read_timeout, read_body):
+        await self.start()
+        kwargs = {"params": params}
+        if read_timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=self.timeout.sock_connect, sock_read=read_timeout)
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            try:
+                async with self._session.get(url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < HTTP_MAX_RETRIES:
+                        logger.warning("HTTP %d from %s, retrying", response.status, response.url.host)
+                    elif response.status >= 400:
+                        raise UpstreamHTTPError(response.status, str(response.url.with_query(None)))
+                    else:
+                        return await read_body(response)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= HTTP_MAX_RETRIES:
+                    raise
+                logger.warning("Request to %s failed (%s), retrying", url, type(e).__name__)
+            await asyncio.sleep(0.1 * 2 ** attempt)
@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import (
+    JOBS_DB, JOB_WORKERS, JOB_MAX_QUEUED, JOB_LEASE_TIMEOUT, JOB_MAX_ATTEMPTS,
+    JOB_PROGRESS_INTERVAL, JOB_RESULT_TTL
+)
+from app.models.trip import TripRequest
+from app.services.metrics import JOB_RUN, JOB_WAIT, JOBS_FINISHED, REGISTRY
+from app.services.trip_planner import TripPlanner
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+_COLUMNS = (
+    "id, status, request, progress, result, error, attempts, "
+    "created_at, started_at, updated_at, finished_at"
+)
+
+
+class IdempotencyConflictError(Exception):
+    """
+    An idempotency key was reused with a different request body.
+    """
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _request_hash(request: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class JobStore:
+    """
+    Trip planning jobs in a SQLite file, so queued and finished jobs survive
+    restarts and are shared by every worker process on the host. Workers
+    claim jobs in a write transaction, so each job runs once at a time.
+    """
+
+    def __init__(self, path: Path = JOBS_DB):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE, request_hash TEXT NOT NULL, "
+            "status TEXT NOT NULL, request TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, "
+            "updated_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def create(self, request: Dict[str, Any], idempotency_key: Optional[str] = None,
+               max_queued: int = JOB_MAX_QUEUED) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job and return (job, created). A known idempotency key returns
+        the existing job instead, unless that job failed: a failed job is
+        queued again as a retry. Reusing a key for a different request raises
+        IdempotencyConflictError.
+        """
+        request_hash = _request_hash(request)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                retry_id = None
+                if idempotency_key is not None:
+                    row = self._conn.execute(
+                        f"SELECT request_hash, {_COLUMNS} FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+                    ).fetchone()
+                    if row is not None:
+                        if row[0] != request_hash:
+                            raise IdempotencyConflictError("Idempotency key was used for a different request")
+                        job = self._to_job(row[1:])
+                        if job["status"] != "failed":
+                            self._conn.execute("COMMIT")
+                            return job, False
+                        retry_id = job["id"]
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFullError(f"{queued} jobs already queued")
+                if retry_id is not None:
+                    job_id = retry_id
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', progress = NULL, result = NULL, error = NULL, "
+                        "attempts = 0, created_at = ?, started_at = NULL, updated_at = ?, finished_at = NULL "
+                        "WHERE id = ?",
+                        (now, now, job_id)
+                    )
+                else:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, idempotency_key, request_hash, status, request, created_at, updated_at) "
+                        "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                        (job_id, idempotency_key, request_hash, json.dumps(request), now, now)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def queue_position(self, job: Dict[str, Any]) -> int:
+        """
+        Number of queued jobs ahead of this one.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+            ).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the oldest queued job as running and return it, or None if the queue is empty.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                        "started_at = ?, updated_at = ? WHERE id = ?",
+                        (now, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]):
+        self._write(
+            "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+            (json.dumps(progress), time.time(), job_id)
+        )
+
+    def finish(self, job_id: str, status: str, progress: Dict[str, Any],
+               result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        now = time.time()
+        self._write(
+            "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, updated_at = ?, finished_at = ? "
+            "WHERE id = ?",
+            (status, json.dumps(progress), json.dumps(result) if result is not None else None, error, now, now, job_id)
+        )
+
+    def release(self, job_id: str):
+        """
+        Put a running job back in the queue, e.g. when its worker shuts down.
+        """
+        self._write(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, updated_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (time.time(), job_id)
+        )
+
+    def recover_stale(self, lease_timeout: float = JOB_LEASE_TIMEOUT, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """
+        Requeue running jobs whose worker stopped reporting (e.g. the process
+        died), or fail them once they have used up their attempts.
+        """
+        now = time.time()
+        cutoff = now - lease_timeout
+        with self._lock:
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker stopped responding', finished_at = ?, "
+                "updated_at = ? WHERE status = 'running' AND updated_at < ? AND attempts >= ?",
+                (now, now, cutoff, max_attempts)
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, cutoff)
+            ).rowcount
+        return failed + requeued
+
+    def purge_finished(self, ttl: float = JOB_RESULT_TTL):
+        self._write(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (time.time() - ttl,)
+        )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    @staticmethod
+    def _to_job(row: tuple) -> Dict[str, Any]:
+        (job_id, status, request, progress, result, error, attempts,
+         created_at, started_at, updated_at, finished_at) = row
+        return {
+            "id": job_id,
+            "status": status,
+            "request": json.loads(request),
+            "progress": json.loads(progress) if progress else {},
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "updated_at": updated_at,
+            "finished_at": finished_at
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Runs queued trip plans on a bounded pool of asyncio workers. JobStore
+    calls block on SQLite, so they are made on worker threads.
+
+    Each job goes through TripPlanner.stream_trip, so identical jobs share one
+    generation and stale cached plans are served while they are refreshed. As sections, days and destination details arrive they
+    are saved as the job's partial progress, and pollers can show them
+    before the plan is complete.
+    """
+
+    def __init__(self, trip_planner: TripPlanner, store: Optional[JobStore] = None, workers: int = JOB_WORKERS):
+        self.trip_planner = trip_planner
+        self.store = store or JobStore()
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[int, str] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        REGISTRY.register_collector(self._collect_metrics)
+
+    async def submit(
+        self, trip_request: TripRequest, idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        job, created = await asyncio.to_thread(self.store.create, trip_request.model_dump(), idempotency_key)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is not None and job["status"] == "queued":
+            job["queue_position"] = self.store.queue_position(job)
+        return job
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        recovered = self.store.recover_stale()
+        if recovered:
+            logger.warning("Recovered %d stale job(s)", recovered)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs interrupted by the shutdown go back in the queue for the next start
+        for job_id in self._running.values():
+            await asyncio.to_thread(self.store.release, job_id)
+        self._running.clear()
+        await asyncio.to_thread(self.store.close)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # Other processes enqueue too, so poll as well as waiting for a local submit
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running[worker_id] = job["id"]
+            try:
+                await self._run(job)
+            finally:
+                self._running.pop(worker_id, None)
+
+    async def _run(self, job: Dict[str, Any]):
+        JOB_WAIT.observe(job["started_at"] - job["created_at"])
+        started = time.perf_counter()
+        progress: Dict[str, Any] = {"sections": {}, "days": []}
+        result: Dict[str, Any] = {}
+        error = None
+        last_saved = 0.0
+        try:
+            trip_request = TripRequest(**job["request"])
+            async with aclosing(self.trip_planner.stream_trip(trip_request)) as events:
+                async for event, data in events:
+                    if event == "error":
+                        error = data.get("detail", "Trip planning failed")
+                        continue
+                    self._apply(progress, result, event, data)
+                    now = time.monotonic()
+                    if event != "section" or now - last_saved >= JOB_PROGRESS_INTERVAL:
+                        await asyncio.to_thread(self.store.update_progress, job["id"], progress)
+                        last_saved = now
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Job %s failed: %s", job["id"], e, exc_info=True)
+            error = str(e)
+
+        if error is None and "tripPlan" not in result:
+            error = "Trip planning finished without a plan"
+        status = "failed" if error else "succeeded"
+        await asyncio.to_thread(
+            self.store.finish, job["id"], status, progress, result=None if error else result, error=error
+        )
+        JOB_RUN.observe(time.perf_counter() - started)
+        JOBS_FINISHED.inc(status=status)
+
+    @staticmethod
+    def _apply(progress: Dict[str, Any], result: Dict[str, Any], event: str, data: Any):
+        if event == "section":
+            sections = progress["sections"]
+            sections[data["section"]] = sections.get(data["section"], "") + data["text"]
+        elif event == "day":
+            progress["days"].append(data)
+        else:
+            key = {"flights": "flightsInfo", "coordinates": "map_data"}.get(event, event)
+            result[key] = data
+            if event not in ("tripPlan", "sectionStatus"):
+                progress[key] = data
+
+    async def _maintenance(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_TIMEOUT / 4)
+            try:
+                recovered = await asyncio.to_thread(self.store.recover_stale)
+                if recovered:
+                    logger.warning("Recovered %d stale job(s)", recovered)
+                await asyncio.to_thread(self.store.purge_finished)
+            except sqlite3.Error as e:
+                logger.error("Job queue maintenance failed: %s", e)
+
+    def _collect_metrics(self):
+        counts = self.store.counts()
+        yield ("trip_planner_jobs", "gauge", "Jobs in the queue by status.",
+               [({"status": status}, count) for status, count in counts.items()])
+        yield ("trip_planner_job_workers_busy", "gauge", "Job workers running a job in this process.",
+               [({}, len(self._running))])
@@ -0,0 +1,253 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+# Upper bounds in seconds; upstream calls range from cached lookups to long Gemini generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+T = TypeVar("T")
+
+# (metric name, type, help, [(labels, value)]) as yielded by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Holds the application's metrics and renders them in the Prometheus text format.
+    Collectors are called at scrape time for values read from elsewhere, such as cache counters.
+    """
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, e.g. requests served.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, e.g. requests in flight.
+    """
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets. Each observation is a
+    bisect and three additions under a lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, registry: MetricsRegistry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus one overflow slot, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _render_sample(self, key, value) -> List[str]:
+        counts, total = value[0][:], value[1]
+        labels = self._labels(key)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            bucket_labels = {**labels, "le": _format_value(bound)}
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+HTTP_REQUESTS = Counter(
+    "trip_planner_http_requests_total", "HTTP requests served.", ("method", "route", "status")
+)
+HTTP_DURATION = Histogram(
+    "trip_planner_http_request_duration_seconds", "HTTP request duration, including streamed bodies.", ("route",)
+)
+HTTP_IN_FLIGHT = Gauge("trip_planner_http_requests_in_flight", "HTTP requests being served.")
+STAGE_DURATION = Histogram(
+    "trip_planner_stage_duration_seconds", "Duration of upstream calls and pipeline stages.", ("stage",)
+)
+STAGE_IN_FLIGHT = Gauge("trip_planner_stage_in_flight", "Upstream calls and pipeline stages in progress.", ("stage",))
+STAGE_ERRORS = Counter("trip_planner_stage_errors_total", "Upstream calls and pipeline stages that raised.", ("stage",))
+HEDGES_SENT = Counter("trip_planner_hedged_requests_total", "Duplicate upstream calls fired for slow reads.", ("stage",))
+HEDGES_WON = Counter("trip_planner_hedged_requests_won_total", "Duplicate upstream calls that answered first.", ("stage",))
+DEADLINE_TIMEOUTS = Counter(
+    "trip_planner_deadline_timeouts_total", "Plan sections dropped because their time budget ran out.", ("section",)
+)
+JOB_WAIT = Histogram("trip_planner_job_wait_seconds", "Time jobs spent queued before a worker picked them up.")
+JOB_RUN = Histogram("trip_planner_job_run_seconds", "Time workers spent running jobs.")
+JOBS_FINISHED = Counter("trip_planner_jobs_finished_total", "Jobs that finished, by outcome.", ("status",))
+
+# stage -> [first start, last end, count] for the current request, set by the metrics middleware.
+# Tasks spawned by the request inherit it, so their spans land in the same Server-Timing header.
+_request_timings: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block as `stage`: records the stage histogram and in-flight gauge,
+    counts exceptions, and adds it to the current request's Server-Timing.
+    """
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        end = time.perf_counter()
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        STAGE_DURATION.observe(end - start, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            entry = timings.get(stage)
+            if entry is None:
+                timings[stage] = [start, end, 1]
+            else:
+                entry[0] = min(entry[0], start)
+                entry[1] = max(entry[1], end)
+                entry[2] += 1
+
+
+async def timed(stage: str, awaitable: Awaitable[T]) -> T:
+    """
+    Await `awaitable` inside a span, for timing coroutines passed to gather().
+    """
+    with span(stage):
+        return await awaitable
+
+
+def start_request_timing():
+    """
+    Begin collecting spans for a request. Returns (timings, token) for `server_timing`
+    and `end_request_timing`.
+    """
+    timings: Dict[str, list] = {}
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timing(token):
+    _request_timings.reset(token)
+
+
+def server_timing(timings: Dict[str, list], total: float) -> str:
+    """
+    Format request spans as a Server-Timing header value. Repeated stages report
+    the wall-clock time from their first start to their last end.
+    """
+    parts = []
+    for stage, (start, end, count) in list(timings.items()):
+        part = f"{stage};dur={(end - start) * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count} calls"'
+        parts.append(part)
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional, Tuple
+from PIL import Image
+from app.config import (
+    PHOTO_CACHE_DIR, PHOTO_CACHE_MAX_AGE, PHOTO_CACHE_MAX_BYTES, PHOTO_CACHE_SWEEP_INTERVAL,
+    PHOTO_CACHE_TOUCH_INTERVAL, PHOTO_SOURCE_WIDTH, PHOTO_WIDTHS
+)
+from app.services.cache import SingleFlight, TieredCache
+from app.services.google_maps_service import GoogleMapsService
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg")
+}
+
+
+def snap_width(width: Optional[int]) -> int:
+    """
+    Round a requested width up to the nearest width we generate, so thumbnails stay cacheable.
+    """
+    if not width:
+        return PHOTO_WIDTHS[-1]
+    return next((w for w in PHOTO_WIDTHS if w >= width), PHOTO_WIDTHS[-1])
+
+
+class PhotoService:
+    """
+    Fetches Places photos once and serves resized thumbnails from a
+    content-addressed disk cache under PHOTO_CACHE_DIR.
+
+    The original image is stored under the SHA-256 of its bytes, and each
+    thumbnail is derived from it as `<hash>-<width>.<format>`. Photo references
+    map to content hashes through a small persistent cache. The hash also serves
+    as a stable ETag.
+
+    The directory is swept every PHOTO_CACHE_SWEEP_INTERVAL: files unused for
+    PHOTO_CACHE_MAX_AGE are deleted, then the least recently used ones until
+    it is back under PHOTO_CACHE_MAX_BYTES. A file's mtime is its last use.
+    Deleted files are fetched or derived again on their next request.
+    """
+
+    def __init__(self, google_maps_service: GoogleMapsService, cache_dir: Path = PHOTO_CACHE_DIR):
+        self.google_maps_service = google_maps_service
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._refs = TieredCache("photo_refs", maxsize=4096, ttl=PHOTO_CACHE_MAX_AGE)
+        self._single_flight = SingleFlight()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    async def _sweep_periodically(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except OSError as e:
+                logger.error("Photo cache sweep failed: %s", e)
+            await asyncio.sleep(PHOTO_CACHE_SWEEP_INTERVAL)
+
+    def sweep(self, max_age: float = PHOTO_CACHE_MAX_AGE, max_bytes: int = PHOTO_CACHE_MAX_BYTES) -> int:
+        """
+        Delete expired files, then least recently used ones while the cache is
+        over `max_bytes`. Returns the number of files deleted.
+        """
+        now = time.time()
+        files: List[Tuple[float, int, Path]] = []
+        for path in self.cache_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # Temporary files belong to writes in progress until they are old enough to be abandoned
+            if path.suffix != ".tmp" or now - stat.st_mtime > max_age:
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for mtime, size, path in files:
+            if now - mtime <= max_age and total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            deleted += 1
+        if deleted:
+            logger.info("Photo cache sweep deleted %d files, %d bytes left", deleted, total)
+        return deleted
+
+    async def get_thumbnail(self, photo_reference: str, width: int, fmt: str) -> Tuple[bytes, str, str]:
+        """
+        Return (image bytes, ETag, content type) for the photo at the given width and format.
+        """
+        content_hash = await self._get_original(photo_reference)
+        etag = f'"{content_hash[:32]}-{width}-{fmt}"'
+        path = self._path(content_hash, f"{width}.{fmt}")
+        if path.exists():
+            try:
+                return await asyncio.to_thread(self._read, path), etag, PHOTO_FORMATS[fmt][1]
+            except FileNotFoundError:
+                # Swept since the check; derive it again
+                content_hash = await self._get_original(photo_reference)
+        await self._single_flight.run(
+            path.name, lambda: asyncio.to_thread(self._write_thumbnail, content_hash, width, fmt)
+        )
+        return await asyncio.to_thread(self._read, path), etag, PHOTO_FORMATS[fmt][1]
+
+    async def etag_for(self, photo_reference: str, width: int, fmt: str) -> Optional[str]:
+        """
+        The ETag a thumbnail would have, if its original is already cached.
+        """
+        content_hash = await self._refs.get(photo_reference)
+        if content_hash is None:
+            return None
+        return f'"{content_hash[:32]}-{width}-{fmt}"'
+
+    async def _get_original(self, photo_reference: str) -> str:
+        content_hash = await self._refs.get(photo_reference)
+        if content_hash is not None and self._path(content_hash, "orig").exists():
+            return content_hash
+        return await self._single_flight.run(photo_reference, lambda: self._download(photo_reference))
+
+    async def _download(self, photo_reference: str) -> str:
+        data = await self.google_maps_service.fetch_photo(photo_reference, max_width=PHOTO_SOURCE_WIDTH)
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._path(content_hash, "orig")
+        if not path.exists():
+            await asyncio.to_thread(self._atomic_write, path, data)
+        self._refs.set(photo_reference, content_hash)
+        return content_hash
+
+    def _write_thumbnail(self, content_hash: str, width: int, fmt: str):
+        original = self._path(content_hash, "orig")
+        self._touch(original)
+        with Image.open(original) as image:
+            image = image.convert("RGB")
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                image = image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, format=PHOTO_FORMATS[fmt][0], quality=80, optimize=True)
+        self._atomic_write(self._path(content_hash, f"{width}.{fmt}"), buffer.getvalue())
+
+    def _read(self, path: Path) -> bytes:
+        data = path.read_bytes()
+        self._touch(path)
+        return data
+
+    @staticmethod
+    def _touch(path: Path):
+        # Record the use for the sweep's LRU order
+        try:
+            if time.time() - path.stat().st_mtime > PHOTO_CACHE_TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _path(self, content_hash: str, suffix: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f"{content_hash}-{suffix}"
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        # Write then rename, so concurrent workers never read a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self._refs.close()
@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import CACHE_TIMEOUT, PLAN_CACHE_SIZE, PLAN_CACHE_STALE_TTL
+from app.services.cache import SingleFlight, TieredCache
+from app.services.deadline import detached
+
+logger = logging.getLogger(__name__)
+
+
+class PlanCache:
+    """
+    Cache of assembled trip plans keyed by TripRequest.canonical_key().
+
+    Entries are fresh for CACHE_TIMEOUT. After that they are served stale for up to
+    PLAN_CACHE_STALE_TTL while a background refresh recomputes them. Concurrent
+    misses for the same key share a single upstream computation.
+    """
+
+    def __init__(self, ttl: float = CACHE_TIMEOUT, stale_ttl: float = PLAN_CACHE_STALE_TTL):
+        self.ttl = ttl
+        self._cache = TieredCache("trip_plans", maxsize=PLAN_CACHE_SIZE, ttl=ttl + stale_ttl)
+        self._single_flight = SingleFlight()
+        self._background_tasks = set()
+        self.stale_hits = 0
+
+    async def get(self, key: str) -> Any:
+        """
+        Return the cached plan for `key` regardless of age, or None.
+        """
+        entry = await self._cache.get(key)
+        return entry["result"] if entry else None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        self._cache.set(key, {"stored_at": time.time(), "result": result})
+
+    async def age(self, key: str) -> Optional[float]:
+        """
+        Seconds since the plan for `key` was stored, or None if there is none.
+        """
+        entry = await self._cache.get(key)
+        return time.time() - entry["stored_at"] if entry else None
+
+    async def cached(
+        self,
+        key: str,
+        refresh: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached plan for `key`, or None. A plan past its TTL is
+        still returned, and recomputed with `refresh` in the background.
+        """
+        entry = await self._cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl and key not in self._single_flight:
+            self.stale_hits += 1
+            logger.info("Serving stale trip plan, refreshing in background: %s", key)
+            # Outside the request's context: its deadline and Server-Timing must not apply to the refresh
+            task = asyncio.create_task(
+                detached(self._compute(key, refresh, cacheable)), context=contextvars.Context()
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return entry["result"]
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True,
+        refresh: Optional[Callable[[], Awaitable[Dict[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Return the cached plan for `key`, computing it on a miss. Results rejected
+        by `cacheable` are returned but not stored. Stale plans are refreshed
+        with `refresh`, by default `compute`.
+        """
+        result = await self.cached(key, refresh or compute, cacheable)
+        if result is not None:
+            return result
+        return await self._compute(key, compute, cacheable)
+
+    async def refresh(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True
+    ) -> Dict[str, Any]:
+        """
+        Recompute the plan for `key` whether or not it is cached, joining a
+        computation already in flight for it.
+        """
+        return await self._compute(key, compute, cacheable)
+
+    async def _compute(self, key, compute, cacheable) -> Dict[str, Any]:
+        async def compute_and_store():
+            result = await compute()
+            if cacheable(result):
+                self.set(key, result)
+            return result
+
+        return await self._single_flight.run(key, compute_and_store)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats.update({
+            "stale_hits": self.stale_hits,
+            "coalesced": self._single_flight.coalesced,
+            "in_flight": len(self._single_flight)
+        })
+        return stats
+
+    def close(self):
+        self._cache.close()
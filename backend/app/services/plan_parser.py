@@ -0,0 +1,177 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.trip import DayPlan, TripPlan
+
+SECTION_KEYS = {
+    "OVERVIEW": "overview",
+    "ITINERARY": "itinerary",
+    "PRACTICAL_INFO": "practicalInfo"
+}
+# "#OVERVIEW", "## ITINERARY", "**PRACTICAL_INFO**" at the start of a line
+SECTION_MARKER = re.compile(r"^\s*(?:#+|\*\*)\s*(OVERVIEW|ITINERARY|PRACTICAL_INFO)\b\**:?\s*(.*)$")
+# "Day 3: Title", "### Day 3 - Title", "**Day 3**" but not "Day 3 is for..."
+DAY_HEADER = re.compile(r"^Day\s+(\d{1,2})\s*(?:[:\-–—.)]\s*(.*))?$", re.IGNORECASE)
+# "Morning:", "- **Afternoon (2pm):** ...", "Evening - ..."
+SLOT_HEADER = re.compile(
+    r"^(morning|afternoon|evening|night)\**\s*(?:\([^)]*\))?\s*\**\s*[:\-–—]\s*\**\s*(.*)$",
+    re.IGNORECASE
+)
+SLOT_NAMES = {"morning": "morning", "afternoon": "afternoon", "evening": "evening", "night": "evening"}
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def _strip_markup(line: str) -> str:
+    return line.strip().lstrip("#").strip().strip("*_").strip()
+
+
+def _strip_bullet(line: str) -> str:
+    return _strip_markup(re.sub(r"^\s*(?:[-*+•]|\d+[.)])\s+", "", line))
+
+
+class TripPlanParser:
+    """
+    Single-pass, incremental parser for Gemini trip plans.
+
+    Text is fed in arbitrary chunks. `feed` returns the events that became
+    available: ("section", {"section", "text"}) deltas as soon as text can no
+    longer turn into a section marker, and ("day", DayPlan) once a day of the
+    itinerary is complete. Each line is tokenized once; `result` returns the
+    structured TripPlan.
+    """
+
+    def __init__(self):
+        self._line = ""
+        self._emitted = 0
+        self._section: Optional[str] = None
+        self._started = False
+        self._sections = {key: [] for key in SECTION_KEYS.values()}
+        self._days: List[DayPlan] = []
+        self._day: Optional[DayPlan] = None
+        self._slot: Optional[str] = None
+        self._closed = False
+
+    def feed(self, text: str) -> List[Event]:
+        events: List[Event] = []
+        self._line += text
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            self._finish_line(line, events, newline=True)
+        # Send the incomplete line early unless it could still become a marker
+        if self._section is not None and self._line and self._is_plain_text(self._line):
+            self._emit(self._line[self._emitted:], events)
+            self._emitted = len(self._line)
+        return events
+
+    def close(self) -> List[Event]:
+        """
+        Flush the remaining text. The parser cannot be fed afterwards.
+        """
+        events: List[Event] = []
+        if not self._closed:
+            if self._line:
+                self._finish_line(self._line, events, newline=False)
+                self._line = ""
+            self._end_day(events)
+            self._closed = True
+        return events
+
+    def result(self) -> TripPlan:
+        sections = {key: "".join(parts).strip() for key, parts in self._sections.items()}
+        days = list(self._days)
+        if self._day is not None:
+            days.append(self._day)
+        return TripPlan(days=[self._clean_day(day) for day in days], **sections)
+
+    def _finish_line(self, line: str, events: List[Event], newline: bool):
+        emitted, self._emitted = self._emitted, 0
+        marker = SECTION_MARKER.match(line) if emitted == 0 else None
+        if marker:
+            self._end_day(events)
+            self._section = SECTION_KEYS[marker.group(1)]
+            self._started = False
+            line, emitted = marker.group(2), 0
+            if not line:
+                return
+        if self._section is None:
+            return
+        self._emit(line[emitted:] + ("\n" if newline else ""), events)
+        if self._section == "itinerary":
+            self._parse_itinerary_line(line, events)
+
+    def _parse_itinerary_line(self, line: str, events: List[Event]):
+        day = DAY_HEADER.match(_strip_markup(line))
+        if day:
+            self._end_day(events)
+            self._day = DayPlan(day=int(day.group(1)), title=_strip_markup(day.group(2) or ""))
+            self._slot = None
+            return
+        if self._day is None:
+            return
+        slot = SLOT_HEADER.match(_strip_bullet(line))
+        if slot:
+            self._slot = SLOT_NAMES[slot.group(1).lower()]
+            line = slot.group(2)
+        field = self._slot or "notes"
+        setattr(self._day, field, getattr(self._day, field) + line + "\n")
+
+    def _end_day(self, events: List[Event]):
+        if self._day is None:
+            return
+        day = self._clean_day(self._day)
+        self._days.append(day)
+        self._day = None
+        self._slot = None
+        events.append(("day", day.model_dump()))
+
+    @staticmethod
+    def _clean_day(day: DayPlan) -> DayPlan:
+        return day.model_copy(update={
+            field: getattr(day, field).strip()
+            for field in ("morning", "afternoon", "evening", "notes")
+        })
+
+    def _emit(self, text: str, events: List[Event]):
+        if not self._started:
+            text = text.lstrip()
+        if not text:
+            return
+        self._started = True
+        self._sections[self._section].append(text)
+        events.append(("section", {"section": self._section, "text": text}))
+
+    @staticmethod
+    def _is_plain_text(partial: str) -> bool:
+        stripped = partial.lstrip(" \t#*")
+        if len(stripped) == len(partial.lstrip(" \t")):
+            # No marker prefix, so this can only be content
+            return True
+        return bool(stripped) and not any(
+            name.startswith(stripped[:len(name)]) for name in SECTION_KEYS
+        )
+
+
+def format_day(day: DayPlan) -> str:
+    """
+    Render a day in the itinerary format the prompts ask for, which parses
+    back into the same DayPlan. Notes go before the time slots, since text
+    after a slot is read as part of it.
+    """
+    lines = [f"**Day {day.day}: {day.title}**" if day.title else f"**Day {day.day}**"]
+    if day.notes:
+        lines.append(day.notes)
+    for slot in ("morning", "afternoon", "evening"):
+        text = getattr(day, slot)
+        if text:
+            lines.append(f"- **{slot.capitalize()}:** {text}")
+    return "\n".join(lines)
+
+
+def parse_trip_plan(response_text: str) -> TripPlan:
+    """
+    Parse a complete Gemini response into a TripPlan.
+    """
+    parser = TripPlanParser()
+    parser.feed(response_text)
+    parser.close()
+    return parser.result()
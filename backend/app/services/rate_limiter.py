@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from app.services.deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second up to `capacity`.
+    """
+
+    __slots__ = ("capacity", "rate", "tokens", "updated_at")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_consume(self, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `tokens` if available. Returns (allowed, seconds until enough tokens exist).
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True, 0.0
+        return False, (tokens - self.tokens) / self.rate
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until `tokens` would be available, without taking them.
+        """
+        self._refill(time.monotonic())
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def available(self) -> float:
+        """
+        Tokens available now; negative while reservations are outstanding.
+        """
+        self._refill(time.monotonic())
+        return self.tokens
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take `tokens` now, going into debt if needed. Returns how long the caller
+        should wait before its reservation is covered.
+        """
+        self._refill(time.monotonic())
+        self.tokens -= tokens
+        return max(0.0, -self.tokens / self.rate)
+
+
+class ClientRateLimiter:
+    """
+    Per-client token buckets. Buckets live in an LRU of at most `max_clients`
+    entries, so memory stays bounded and idle clients are evicted first.
+    """
+
+    def __init__(self, requests: int, period: float, max_clients: int = 10000):
+        self.capacity = requests
+        self.rate = requests / period
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, client_id: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Count `cost` requests for `client_id`. Returns (allowed, retry_after_seconds).
+        """
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.capacity, self.rate)
+                self._buckets[client_id] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            allowed, retry_after = bucket.try_consume(cost)
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            return allowed, retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_clients": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected
+        }
+
+
+class QuotaExceededError(Exception):
+    """
+    Raised when an upstream call would have to wait longer than allowed for quota.
+    """
+
+
+class UpstreamGovernor:
+    """
+    Keeps outbound calls to one provider within its QPS limit. Callers near the
+    limit are queued for up to `max_wait` seconds, or what is left of the
+    request's deadline if that is less, instead of failing immediately.
+    """
+
+    def __init__(self, name: str, qps: float, burst: float = None, max_wait: float = 5.0):
+        self.name = name
+        self.max_wait = max_wait
+        self._bucket = TokenBucket(burst or qps, qps)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.waiting = 0
+
+    async def acquire(self):
+        """
+        Wait until a call slot is free, or raise QuotaExceededError if that would
+        take longer than `max_wait` or run past the request's deadline. A
+        rejected call does not use up a slot.
+        """
+        max_wait = remaining(self.max_wait)
+        with self._lock:
+            wait = self._bucket.wait_time()
+            if wait > max_wait:
+                self.rejected += 1
+                logger.warning(
+                    "Rejecting %s call, quota wait would be %.1fs with %.1fs allowed", self.name, wait, max_wait
+                )
+                raise QuotaExceededError(
+                    f"{self.name} quota exhausted, next slot in {wait:.1f}s"
+                )
+            wait = self._bucket.reserve()
+            self.calls += 1
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+        if wait > 0:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+
+    @property
+    def burst(self) -> float:
+        """
+        Calls that can start at once when the provider has been idle.
+        """
+        return self._bucket.capacity
+
+    def headroom(self) -> float:
+        """
+        Fraction of the burst free right now: 1.0 when the provider has been
+        idle for a while, 0 or less while calls are queued for quota.
+        """
+        with self._lock:
+            return self._bucket.available() / self._bucket.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "qps": self._bucket.rate,
+            "calls": self.calls,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "waiting": self.waiting,
+            "avg_wait_seconds": round(self.total_wait / self.delayed, 4) if self.delayed else 0.0
+        }
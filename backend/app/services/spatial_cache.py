@@ -0,0 +1,243 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import (
+    CACHE_ENABLED, NEARBY_CACHE_PRECISION, NEARBY_CACHE_TTL, NEARBY_CACHE_MAX_CELLS, NEARBY_CACHE_MIN_COVERAGE
+)
+from app.services.cache import register_cache
+
+logger = logging.getLogger(__name__)
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle distance in meters.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeohashGrid:
+    """
+    The grid of geohash cells at one precision. Cells are addressed by
+    (row, col) indices into the grid and named by their geohash.
+    """
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        bits = 5 * precision
+        # Geohash interleaves bits starting with longitude, so longitude gets the odd one
+        self.lng_bits = (bits + 1) // 2
+        self.lat_bits = bits // 2
+        self.rows = 1 << self.lat_bits
+        self.cols = 1 << self.lng_bits
+        self.cell_height = 180 / self.rows
+        self.cell_width = 360 / self.cols
+
+    def cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        row = min(self.rows - 1, max(0, int((lat + 90) / self.cell_height)))
+        col = int((lng + 180) / self.cell_width) % self.cols
+        return row, col
+
+    def center(self, row: int, col: int) -> Tuple[float, float]:
+        return -90 + (row + 0.5) * self.cell_height, -180 + (col + 0.5) * self.cell_width
+
+    def geohash(self, row: int, col: int) -> str:
+        value = 0
+        lat_bit, lng_bit = self.lat_bits, self.lng_bits
+        for i in range(5 * self.precision):
+            if i % 2 == 0:
+                lng_bit -= 1
+                value = (value << 1) | ((col >> lng_bit) & 1)
+            else:
+                lat_bit -= 1
+                value = (value << 1) | ((row >> lat_bit) & 1)
+        chars = []
+        for _ in range(self.precision):
+            chars.append(_BASE32[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+    def encode(self, lat: float, lng: float) -> str:
+        return self.geohash(*self.cell_of(lat, lng))
+
+    def half_diagonal(self, lat: float) -> float:
+        """
+        Half the diagonal of a cell at this latitude, in meters.
+        """
+        height = self.cell_height * METERS_PER_DEGREE
+        width = self.cell_width * METERS_PER_DEGREE * math.cos(math.radians(lat))
+        return math.hypot(height, width) / 2
+
+    def cells_in_circle(self, lat: float, lng: float, radius: float) -> List[str]:
+        """
+        Geohashes of the cells whose center lies within `radius` meters of the
+        point, or just the point's own cell when the circle is smaller than a cell.
+        """
+        dlat = radius / METERS_PER_DEGREE
+        dlng = radius / (METERS_PER_DEGREE * max(0.01, math.cos(math.radians(lat))))
+        row_min, col_min = self.cell_of(lat - dlat, lng - dlng)
+        row_max, col_max = self.cell_of(lat + dlat, lng + dlng)
+        col_span = (col_max - col_min) % self.cols
+        cells = []
+        for row in range(row_min, row_max + 1):
+            for offset in range(col_span + 1):
+                col = (col_min + offset) % self.cols
+                if haversine_m(lat, lng, *self.center(row, col)) <= radius:
+                    cells.append(self.geohash(row, col))
+        return cells or [self.encode(lat, lng)]
+
+
+class _Cell:
+    __slots__ = ("covered", "expires", "places")
+
+    def __init__(self, expires: float):
+        self.covered = False
+        self.expires = expires
+        # place_id -> (rank in the search that returned it, place)
+        self.places: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+
+class SpatialCache:
+    """
+    Places nearby-search results indexed by geohash cell and kind of search
+    (place type and keyword), so that searches around nearby points share
+    results: "London", "Central London" and "Westminster" geocode to points a
+    kilometer or two apart whose 5 km circles mostly overlap.
+
+    Storing a search marks every cell whose center is inside its circle as
+    covered and files each returned place under its own cell. A later search
+    is answered from the cache when at least `min_coverage` of the cells in
+    its circle are covered: the places in those cells are merged, filtered to
+    the circle and ordered by the rank Google gave them, then by distance.
+
+    Each cell expires `ttl` seconds after it was filled and is then refetched
+    from scratch. At most `max_cells` cells are kept, least recently used
+    first out.
+
+    Returned place dicts are shared; callers must not modify them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        precision: int = NEARBY_CACHE_PRECISION,
+        ttl: float = NEARBY_CACHE_TTL,
+        max_cells: int = NEARBY_CACHE_MAX_CELLS,
+        min_coverage: float = NEARBY_CACHE_MIN_COVERAGE
+    ):
+        self.name = name
+        self.enabled = CACHE_ENABLED
+        self.grid = GeohashGrid(precision)
+        self.ttl = ttl
+        self.max_cells = max_cells
+        self.min_coverage = min_coverage
+        self._cells: "OrderedDict[Tuple[str, str], _Cell]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_cache(name, self)
+
+    def get(self, lat: float, lng: float, radius: float, kind: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Places of `kind` within `radius` meters of the point, or None when the
+        cached cells do not cover enough of the circle.
+        """
+        if not self.enabled:
+            return None
+        cells = set(self.grid.cells_in_circle(lat, lng, radius))
+        # Cells straddling the rim hold places inside the circle too
+        rim = set(self.grid.cells_in_circle(lat, lng, radius + self.grid.half_diagonal(lat))) - cells
+        now = time.time()
+        covered = 0
+        candidates: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        with self._lock:
+            for geohash in [*cells, *rim]:
+                cell = self._live_cell((kind, geohash), now)
+                if cell is None:
+                    continue
+                if geohash in cells:
+                    covered += cell.covered
+                self._merge(candidates, cell.places)
+            if covered < self.min_coverage * len(cells):
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        ranked = []
+        for rank, place in candidates.values():
+            distance = self._distance(lat, lng, place)
+            if distance is not None and distance <= radius:
+                ranked.append((rank, distance, place))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [place for _, _, place in ranked]
+
+    def put(self, lat: float, lng: float, radius: float, kind: str, places: List[Dict[str, Any]]):
+        """
+        Record the result of a nearby search for `kind` around the point.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            for geohash in self.grid.cells_in_circle(lat, lng, radius):
+                self._cell_for_update((kind, geohash), now).covered = True
+            for rank, place in enumerate(places):
+                location = place.get("geometry", {}).get("location")
+                if not location or "place_id" not in place:
+                    continue
+                cell = self._cell_for_update((kind, self.grid.encode(location["lat"], location["lng"])), now)
+                self._merge(cell.places, {place["place_id"]: (rank, place)})
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+
+    def _live_cell(self, key: Tuple[str, str], now: float) -> Optional[_Cell]:
+        cell = self._cells.get(key)
+        if cell is None:
+            return None
+        if cell.expires <= now:
+            del self._cells[key]
+            return None
+        self._cells.move_to_end(key)
+        return cell
+
+    def _cell_for_update(self, key: Tuple[str, str], now: float) -> _Cell:
+        # Fresh cells keep their expiry, so a cell is never older than ttl however often it is topped up
+        cell = self._live_cell(key, now)
+        if cell is None:
+            cell = self._cells[key] = _Cell(now + self.ttl)
+        return cell
+
+    @staticmethod
+    def _merge(into: Dict[str, Tuple[int, Dict[str, Any]]], places: Dict[str, Tuple[int, Dict[str, Any]]]):
+        for place_id, entry in places.items():
+            existing = into.get(place_id)
+            if existing is None or entry[0] < existing[0]:
+                into[place_id] = entry
+
+    @staticmethod
+    def _distance(lat: float, lng: float, place: Dict[str, Any]) -> Optional[float]:
+        location = place.get("geometry", {}).get("location")
+        if not location:
+            return None
+        return haversine_m(lat, lng, location["lat"], location["lng"])
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cells),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
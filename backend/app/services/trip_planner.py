@@ -0,0 +1,504 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from app.config import DESTINATION_GUIDE_CACHE_SIZE, DESTINATION_GUIDE_TTL, PLAN_TRIP_DEADLINE, STAGE_BUDGETS
+from app.models.trip import TripPlan, TripRequest
+from app.services.cache import SingleFlight, TieredCache
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.deadline import deadline_scope, within_or_default
+from app.services.gemini_service import GeminiService
+from app.services.google_maps_service import GoogleMapsService, normalize_location
+from app.logging_setup import summarize
+from app.services.metrics import DEADLINE_TIMEOUTS, span, timed
+from app.services.plan_cache import PlanCache
+from app.services.plan_parser import TripPlanParser, parse_trip_plan
+
+logger = logging.getLogger(__name__)
+
+
+def is_complete_plan(result: Dict[str, Any]) -> bool:
+    """
+    Whether a plan is good enough to cache: degraded lookups are not pinned.
+    """
+    return (
+        bool(result.get("tripPlan"))
+        and not result.get("accommodations", {}).get("partial", False)
+        and bool(result.get("photos"))
+        and result.get("photos") != ["default_photo_url"]
+        and all(status == "ok" for status in result.get("sectionStatus", {}).values())
+    )
+
+
+def require_itinerary(itinerary: TripPlan) -> TripPlan:
+    """
+    Return the parsed itinerary, or raise ValueError if Gemini's text had none,
+    e.g. when the #ITINERARY section is missing.
+    """
+    if not itinerary.days and not itinerary.itinerary.strip():
+        raise ValueError("Gemini response has no itinerary")
+    return itinerary
+
+
+def cached_plan_events(result: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """
+    Replay a cached plan as the events the streaming endpoint would have sent.
+    """
+    return [
+        ("flights", result["flightsInfo"]),
+        ("coordinates", result["map_data"]),
+        ("tripPlan", result["tripPlan"]),
+        ("accommodations", result["accommodations"]),
+        ("photos", result["photos"]),
+        ("sectionStatus", result.get("sectionStatus", {}))
+    ]
+
+
+class TripPlanner:
+    """
+    Runs the plan-trip pipeline. Gemini generation and the Google Maps chain
+    (geocode, then hotels and photos together) run concurrently, so a request
+    takes roughly as long as the slower of the two instead of their sum.
+
+    Only the itinerary is generated per request. The overview and practical
+    info depend on nothing but the destination and month, so they are generated
+    once as a destination guide and shared by every trip that matches.
+    """
+
+    def __init__(self, gemini_service: GeminiService, google_maps_service: GoogleMapsService):
+        self.gemini_service = gemini_service
+        self.google_maps_service = google_maps_service
+        self.plan_cache = PlanCache()
+        self._guide_cache = TieredCache(
+            "destination_guides",
+            maxsize=DESTINATION_GUIDE_CACHE_SIZE,
+            disk_ttl=DESTINATION_GUIDE_TTL
+        )
+        self._guide_single_flight = SingleFlight()
+
+    def close(self):
+        self.plan_cache.close()
+        self._guide_cache.close()
+
+    async def get_destination_details(
+        self,
+        destination: str
+    ) -> Tuple[Dict[str, float], Dict[str, Any], List[str], Dict[str, str]]:
+        """
+        Geocode the destination once, then fetch hotels and photos in parallel.
+        Each stage gets its STAGE_BUDGETS share of the request's deadline; the
+        last element maps each section to "ok", or "timeout" if it was cut off.
+        """
+        maps = self.google_maps_service
+        with span("geocoding"):
+            coordinates, coordinates_status = await within_or_default(
+                maps.get_coordinates(destination), {"lat": 0, "lng": 0}, STAGE_BUDGETS["geocoding"]
+            )
+        (hotels_info, hotels_status), (photos, photos_status) = await asyncio.gather(
+            timed("hotels", within_or_default(
+                maps.get_hotels(destination, coordinates=coordinates),
+                {"hotels": [], "partial": True},
+                STAGE_BUDGETS["hotels"]
+            )),
+            timed("photos", within_or_default(
+                maps.get_places_photos(destination, coordinates=coordinates), [], STAGE_BUDGETS["photos"]
+            ))
+        )
+        status = {"map_data": coordinates_status, "accommodations": hotels_status, "photos": photos_status}
+        return coordinates, hotels_info, photos, status
+
+    async def plan_trip(self, trip_request: TripRequest) -> Dict[str, Any]:
+        """
+        Return the trip plan for the request, served from the plan cache when an
+        equivalent request has been planned before. Planning has
+        PLAN_TRIP_DEADLINE seconds; see _build_trip_plan for what is returned
+        when that runs out.
+        """
+        with deadline_scope(PLAN_TRIP_DEADLINE):
+            return await self.plan_cache.get_or_compute(
+                trip_request.canonical_key(),
+                lambda: self._build_trip_plan(trip_request),
+                cacheable=is_complete_plan
+            )
+
+    async def plan_age(self, trip_request: TripRequest) -> Optional[float]:
+        """
+        Seconds since the cached plan for the request was computed, or None if none is cached.
+        """
+        return await self.plan_cache.age(trip_request.canonical_key())
+
+    async def refresh_plan(self, trip_request: TripRequest) -> Dict[str, Any]:
+        """
+        Compute the plan for the request and cache it if complete, even if a
+        cached one exists. Runs without the request deadline, for background
+        work nobody is waiting on.
+        """
+        return await self.plan_cache.refresh(
+            trip_request.canonical_key(),
+            lambda: self._build_trip_plan(trip_request),
+            cacheable=is_complete_plan
+        )
+
+    async def plan_batch(
+        self,
+        trip_requests: List[TripRequest],
+        concurrency: int
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Plan many trips at once, yielding (index, result or exception) as each finishes.
+
+        Work shared across the batch is done once: each unique destination is
+        geocoded and gets its hotels and photos fetched a single time, and
+        identical requests coalesce through the plan cache. At most
+        `concurrency` Gemini generations run at the same time.
+        """
+        destinations: Dict[str, asyncio.Task] = {}
+        for trip_request in trip_requests:
+            key = normalize_location(trip_request.destination)
+            if key not in destinations:
+                destinations[key] = asyncio.create_task(self.get_destination_details(trip_request.destination))
+        gemini_slots = asyncio.Semaphore(concurrency)
+
+        async def plan_one(index: int, trip_request: TripRequest):
+            details = destinations[normalize_location(trip_request.destination)]
+            try:
+                result = await self.plan_cache.get_or_compute(
+                    trip_request.canonical_key(),
+                    lambda: self._build_trip_plan(trip_request, details, gemini_slots),
+                    cacheable=is_complete_plan
+                )
+            except Exception as e:
+                logger.error("Error planning batch item %d: %s", index, e)
+                return index, e
+            return index, result
+
+        tasks = [asyncio.create_task(plan_one(i, r)) for i, r in enumerate(trip_requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in [*tasks, *destinations.values()]:
+                task.cancel()
+
+    async def get_destination_guide(
+        self,
+        trip_request: TripRequest,
+        gemini_slots: Optional[asyncio.Semaphore] = None
+    ) -> Dict[str, str]:
+        """
+        Return {"overview", "practicalInfo"} for the trip's destination and month.
+        Guides are cached, and concurrent requests for the same one share a single generation.
+        """
+        month = trip_request.travel_month()
+        key = self._guide_key(trip_request)
+        cached = await self._guide_cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def generate():
+            text = await self._in_gemini_slot(
+                gemini_slots,
+                lambda: self.gemini_service.generate_destination_guide(trip_request.destination, month)
+            )
+            plan = parse_trip_plan(text)
+            guide = {"overview": plan.overview, "practicalInfo": plan.practicalInfo}
+            if guide["overview"] and guide["practicalInfo"]:
+                self._guide_cache.set(key, guide)
+            return guide
+
+        return await self._guide_single_flight.run(key, generate)
+
+    async def has_destination_guide(self, trip_request: TripRequest) -> bool:
+        return await self._guide_cache.get(self._guide_key(trip_request)) is not None
+
+    @staticmethod
+    def _guide_key(trip_request: TripRequest) -> str:
+        return f"{normalize_location(trip_request.destination)}|{trip_request.travel_month()}"
+
+    @staticmethod
+    async def _in_gemini_slot(gemini_slots: Optional[asyncio.Semaphore], generate: Callable[[], Awaitable[str]]) -> str:
+        if gemini_slots is None:
+            return await generate()
+        async with gemini_slots:
+            return await generate()
+
+    async def _generate_plan(
+        self,
+        trip_request: TripRequest,
+        gemini_slots: Optional[asyncio.Semaphore]
+    ) -> Tuple[TripPlan, str]:
+        """
+        Generate the itinerary while the destination guide is looked up (or
+        generated), then combine the two into the trip plan. The itinerary is
+        required, and a response without one raises ValueError; if the guide
+        fails or is not ready by the deadline the plan goes out without it, and
+        the returned status is "partial".
+        """
+        itinerary_task = asyncio.create_task(self._in_gemini_slot(
+            gemini_slots, lambda: self.gemini_service.generate_itinerary(trip_request)
+        ))
+        guide_task = asyncio.create_task(self.get_destination_guide(trip_request, gemini_slots))
+        try:
+            itinerary_text = await itinerary_task
+            try:
+                guide, status = await within_or_default(guide_task, None)
+            except Exception as e:
+                logger.warning("Planning without the destination guide: %s", e)
+                guide, status = None, "error"
+        finally:
+            itinerary_task.cancel()
+            guide_task.cancel()
+        logger.debug("Received itinerary: %s", summarize(itinerary_text))
+        itinerary = require_itinerary(parse_trip_plan(itinerary_text))
+        guide = guide or {"overview": "", "practicalInfo": ""}
+        trip_plan = TripPlan(
+            overview=guide["overview"],
+            itinerary=itinerary.itinerary,
+            practicalInfo=guide["practicalInfo"],
+            days=itinerary.days
+        )
+        return trip_plan, "ok" if status == "ok" else "partial"
+
+    async def _build_trip_plan(
+        self,
+        trip_request: TripRequest,
+        destination_details: Optional[Awaitable] = None,
+        gemini_slots: Optional[asyncio.Semaphore] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate the trip plan and fetch the destination details, then assemble
+        the final response. Batches pass in shared `destination_details` and a
+        semaphore bounding concurrent Gemini generations.
+        Fails fast with CircuitOpenError while Gemini is down.
+
+        Sections that failed or ran out of time are returned empty, and
+        "sectionStatus" says which: each section is "ok", "partial" (some
+        data missing) or "timeout". Only the itinerary is required; without
+        it planning fails, with DeadlineExceeded if time ran out.
+        """
+        self.gemini_service.breaker.raise_if_open()
+        gemini_task = asyncio.create_task(self._generate_plan(trip_request, gemini_slots))
+        if destination_details is None:
+            maps_task = asyncio.create_task(self.get_destination_details(trip_request.destination))
+        else:
+            # Shielded so that cancelling one plan does not cancel the shared lookups
+            maps_task = asyncio.ensure_future(asyncio.shield(destination_details))
+        try:
+            flights_info = self.google_maps_service.get_realistic_flights(
+                trip_request.fromLocation, trip_request.destination
+            )
+            (trip_plan, plan_status), (coordinates, hotels_info, photos, maps_status) = await asyncio.gather(
+                gemini_task, maps_task
+            )
+        except BaseException:
+            # Don't leave the sibling running once the request has failed
+            gemini_task.cancel()
+            maps_task.cancel()
+            raise
+
+        section_status = {"tripPlan": plan_status, "flightsInfo": "ok", **maps_status}
+        if section_status["accommodations"] == "ok" and hotels_info.get("partial"):
+            section_status["accommodations"] = "partial"
+        if section_status["photos"] == "ok" and not photos:
+            section_status["photos"] = "partial"
+        incomplete = {section: status for section, status in section_status.items() if status != "ok"}
+        if incomplete:
+            logger.warning("Returning trip plan for %s with incomplete sections: %s", trip_request.destination, incomplete)
+            for section, status in incomplete.items():
+                if status == "timeout":
+                    DEADLINE_TIMEOUTS.inc(section=section)
+
+        # Provide a fallback if no photos found
+        if not photos:
+            logger.warning("No photos retrieved from Google Maps API")
+            photos = ["default_photo_url"]  # Temporary fallback
+
+        return {
+            "tripPlan": trip_plan.model_dump(),
+            "flightsInfo": flights_info,
+            "accommodations": hotels_info,
+            "map_data": {
+                "latitude": [float(coordinates["lat"])],
+                "longitude": [float(coordinates["lng"])]
+            },
+            "photos": photos,
+            "sectionStatus": section_status
+        }
+
+    async def stream_trip(self, trip_request: TripRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yield (event, data) pairs as each part of the trip plan becomes available:
+        "flights", "section" chunks of the Gemini text (the destination guide's
+        sections arrive whole, the itinerary as it streams), "day" for each parsed
+        itinerary day, "coordinates", "accommodations", "photos", "tripPlan" with
+        the complete structured plan, and finally "sectionStatus" as in
+        plan_trip's response. Failures are reported as an "error" event.
+        Goes through the plan cache like plan_trip: a stale cached plan is
+        served and refreshed in the background, and identical concurrent streams
+        share one generation, the later ones getting the finished plan's events.
+        Closing the iterator leaves the generation running so it still fills
+        the cache.
+        """
+        cache_key = trip_request.canonical_key()
+        cached = await self.plan_cache.cached(
+            cache_key, lambda: self._build_trip_plan(trip_request), cacheable=is_complete_plan
+        )
+        if cached is not None:
+            for event in cached_plan_events(cached):
+                yield event
+            return
+        if self.gemini_service.breaker.is_open():
+            yield "error", {"detail": str(CircuitOpenError("gemini", self.gemini_service.breaker.retry_after()))}
+            return
+
+        events: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        computation = asyncio.ensure_future(self.plan_cache.get_or_compute(
+            cache_key,
+            lambda: self._stream_plan(trip_request, events.put_nowait),
+            cacheable=is_complete_plan,
+            refresh=lambda: self._build_trip_plan(trip_request)
+        ))
+        # Queued after every event the computation emitted, as those are put synchronously
+        computation.add_done_callback(lambda _: events.put_nowait(finished))
+        live = False
+        try:
+            while (event := await events.get()) is not finished:
+                live = True
+                yield event
+            try:
+                result = computation.result()
+            except Exception as e:
+                if not live:
+                    yield "error", {"detail": str(e)}
+                return
+            if not live:
+                # Another stream ran the generation; replay what it produced
+                for event in cached_plan_events(result):
+                    yield event
+        finally:
+            # Only stops waiting: the shared generation is shielded by the single-flight
+            computation.cancel()
+
+    async def _stream_plan(
+        self, trip_request: TripRequest, emit: Callable[[Tuple[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """
+        Run the streaming pipeline, passing each event to `emit`, and return the
+        assembled plan. Raises the first producer failure once all producers
+        have finished, after its "error" event was emitted.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        errors: List[Exception] = []
+
+        guide_task = asyncio.create_task(self.get_destination_guide(trip_request))
+
+        async def produce_guide():
+            guide = await guide_task
+            for section in ("overview", "practicalInfo"):
+                if guide[section]:
+                    queue.put_nowait(("section", {"section": section, "text": guide[section]}))
+
+        async def produce_plan():
+            parser = TripPlanParser()
+
+            def forward(events):
+                # Only the itinerary comes from this generation; the guide supplies the other sections
+                for name, data in events:
+                    if name == "day" or data["section"] == "itinerary":
+                        queue.put_nowait((name, data))
+
+            async with aclosing(self.gemini_service.stream_itinerary(trip_request)) as chunks:
+                async for text in chunks:
+                    forward(parser.feed(text))
+            forward(parser.close())
+            itinerary = require_itinerary(parser.result())
+            try:
+                guide = await guide_task
+            except Exception:
+                # Already reported by produce_guide
+                return
+            queue.put_nowait(("tripPlan", TripPlan(
+                overview=guide["overview"],
+                itinerary=itinerary.itinerary,
+                practicalInfo=guide["practicalInfo"],
+                days=itinerary.days
+            ).model_dump()))
+
+        async def produce_details():
+            destination = trip_request.destination
+            coordinates = await self.google_maps_service.get_coordinates(destination)
+            queue.put_nowait(("coordinates", {
+                "latitude": [float(coordinates["lat"])],
+                "longitude": [float(coordinates["lng"])]
+            }))
+
+            async def hotels():
+                hotels_info = await self.google_maps_service.get_hotels(destination, coordinates=coordinates)
+                queue.put_nowait(("accommodations", hotels_info))
+
+            async def photos():
+                queue.put_nowait(("photos", await self.google_maps_service.get_places_photos(
+                    destination, coordinates=coordinates
+                )))
+
+            await asyncio.gather(hotels(), photos())
+
+        async def run(producer):
+            try:
+                await producer()
+            except Exception as e:
+                logger.error("Error streaming trip plan: %s", e, exc_info=True)
+                errors.append(e)
+                queue.put_nowait(("error", {"detail": str(e)}))
+            finally:
+                queue.put_nowait(finished)
+
+        tasks = [
+            asyncio.create_task(run(produce_guide)),
+            asyncio.create_task(run(produce_plan)),
+            asyncio.create_task(run(produce_details))
+        ]
+        try:
+            flights_info = self.google_maps_service.get_realistic_flights(
+                trip_request.fromLocation, trip_request.destination
+            )
+            emit(("flights", flights_info))
+            # Assemble the plan from the events so a complete stream can be cached
+            result = {"flightsInfo": flights_info}
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event is finished:
+                    remaining -= 1
+                    continue
+                name, data = event
+                if name in ("tripPlan", "accommodations", "photos"):
+                    result[name] = data
+                elif name == "coordinates":
+                    result["map_data"] = data
+                emit(event)
+            if errors:
+                raise errors[0]
+            trip_plan = result["tripPlan"]
+            result = {
+                "tripPlan": trip_plan,
+                "flightsInfo": flights_info,
+                "accommodations": result["accommodations"],
+                "map_data": result["map_data"],
+                "photos": result["photos"],
+                # Same shape as _build_trip_plan, so both endpoints serve identical cached plans
+                "sectionStatus": {
+                    "tripPlan": "ok" if trip_plan["overview"] and trip_plan["practicalInfo"] else "partial",
+                    "flightsInfo": "ok",
+                    "map_data": "ok",
+                    "accommodations": "partial" if result["accommodations"].get("partial") else "ok",
+                    "photos": "ok" if result["photos"] else "partial"
+                }
+            }
+            emit(("sectionStatus", result["sectionStatus"]))
+            return result
+        finally:
+            for task in [*tasks, guide_task]:
+                task.cancel()
@@ -0,0 +1,343 @@
+import asyncio
+import math
+import random
+import re
+import socket
+import threading
+import time
+import types
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+
+class LatencyModel:
+    """
+    Latency distribution for a fake upstream call.
+
+    "lognormal" (the default) is parameterized by its median and p95, which is
+    how upstream latency is usually reported. "fixed" always returns the median.
+    """
+
+    def __init__(self, median: float, p95: Optional[float] = None, kind: str = "lognormal", error_rate: float = 0.0):
+        self.median = median
+        self.p95 = p95 or median
+        self.kind = kind
+        self.error_rate = error_rate
+        # For a lognormal distribution p95 = median * exp(1.645 * sigma)
+        self.sigma = math.log(self.p95 / self.median) / 1.645 if self.p95 > self.median > 0 else 0.0
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "LatencyModel":
+        return cls(
+            median=spec.get("median", 0.1),
+            p95=spec.get("p95"),
+            kind=spec.get("kind", "lognormal"),
+            error_rate=spec.get("error_rate", 0.0)
+        )
+
+    def sample(self) -> float:
+        if self.kind == "fixed" or self.sigma == 0:
+            return self.median
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+class StageRecorder:
+    """
+    Thread-safe record of how long each fake upstream stage took.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float, failed: bool = False):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+            if failed:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                stage: {"samples": list(samples), "errors": self._errors.get(stage, 0)}
+                for stage, samples in self._samples.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._errors.clear()
+
+
+recorder = StageRecorder()
+
+
+class FakeUpstreamError(Exception):
+    pass
+
+
+def _itinerary_days(prompt: str) -> range:
+    # A block of a long trip ("days 6 to 10 of ..."), or the whole trip
+    block = re.search(r"days (\d+) to (\d+)", prompt)
+    if block:
+        return range(int(block.group(1)), int(block.group(2)) + 1)
+    match = re.search(r"(\d+)-day trip", prompt)
+    return range(1, (int(match.group(1)) if match else 7) + 1)
+
+
+def _generated_days(prompt: str) -> int:
+    """
+    Itinerary days a prompt asks the model to write, which is what its latency grows with.
+    """
+    if "#OUTLINE" in prompt or "#ITINERARY" not in prompt:
+        return 0
+    return len(_itinerary_days(prompt))
+
+
+def _fake_trip_text(prompt: str, size: int) -> str:
+    if "#OUTLINE" in prompt:
+        ranges = re.findall(r"Days \d+-\d+", prompt)
+        return "#OUTLINE\n" + "\n".join(f"{days}: Fake Region - sights and food" for days in ranges)
+    # Answer with the sections the prompt asks for, like the real model would
+    requested = [name for name in ("OVERVIEW", "ITINERARY", "PRACTICAL_INFO") if f"#{name}" in prompt]
+    requested = requested or ["OVERVIEW", "ITINERARY", "PRACTICAL_INFO"]
+    days = _itinerary_days(prompt)
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+    blocks = len(days) * 3 if "ITINERARY" in requested else 0
+    blocks += len(requested) - ("ITINERARY" in requested)
+    per_block = max(1, size // max(1, blocks))
+    body = (filler * (per_block // len(filler) + 1))[:per_block]
+    parts = []
+    for name in requested:
+        parts.append(f"#{name}")
+        if name != "ITINERARY":
+            parts += [body, ""]
+            continue
+        for day in days:
+            parts += [
+                f"**Day {day}: Exploring**",
+                f"- **Morning:** {body}",
+                f"- **Afternoon:** {body}",
+                f"- **Evening:** {body}",
+                ""
+            ]
+    return "\n".join(parts)
+
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    def __init__(self, text: str, latency: float, chunks: int = 20):
+        self._text = text
+        self._latency = latency
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        # A fifth of the latency before the first token, the rest spread over the chunks
+        await asyncio.sleep(self._latency * 0.2)
+        size = max(1, len(self._text) // self._chunks + 1)
+        for i in range(0, len(self._text), size):
+            await asyncio.sleep(self._latency * 0.8 / self._chunks)
+            yield _FakeChunk(self._text[i:i + size])
+
+
+class FakeGenerativeModel:
+    """
+    Stand-in for google.generativeai.GenerativeModel.
+    """
+
+    latency = LatencyModel(2.0, 6.0)
+    response_chars = 6000
+    # Extra latency per itinerary day written, as real generation time grows with output length
+    seconds_per_day = 0.0
+
+    def __init__(self, model_name: str = "", **kwargs):
+        self.model_name = model_name
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        latency = self.latency.sample() + self.seconds_per_day * _generated_days(str(prompt))
+        text = _fake_trip_text(str(prompt), self.response_chars)
+        if self.latency.should_fail():
+            await asyncio.sleep(latency * 0.1)
+            recorder.record("gemini", latency * 0.1, failed=True)
+            raise FakeUpstreamError("fake Gemini failure")
+        if stream:
+            recorder.record("gemini", latency)
+            return _FakeStream(text, latency)
+        await asyncio.sleep(latency)
+        recorder.record("gemini", latency)
+        return _FakeResponse(text)
+
+    async def count_tokens_async(self, contents, **kwargs):
+        # Health probe; cheap on the real API, so not given the generation latency
+        await asyncio.sleep(0.01)
+        if self.latency.should_fail():
+            raise FakeUpstreamError("fake Gemini failure")
+        return types.SimpleNamespace(total_tokens=len(str(contents).split()))
+
+    def generate_content(self, prompt: str, **kwargs):
+        latency = self.latency.sample()
+        time.sleep(latency)
+        recorder.record("gemini", latency)
+        return _FakeResponse(_fake_trip_text(str(prompt), self.response_chars))
+
+
+class FakeMapsServer:
+    """
+    Local stand-in for the Google Maps web services. It answers the endpoints
+    GoogleMapsService calls after a delay drawn from each stage's latency model,
+    and runs on its own event loop thread so the app talks to it over real
+    HTTP connections.
+    """
+
+    latencies: Dict[str, LatencyModel] = {
+        "geocode": LatencyModel(0.08, 0.25),
+        "places_nearby": LatencyModel(0.15, 0.4),
+        "place_details": LatencyModel(0.12, 0.35),
+        "places_photo": LatencyModel(0.1, 0.3)
+    }
+    results_per_search = 20
+    photo_bytes: Optional[bytes] = None
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/maps/api"
+
+    def start(self) -> str:
+        """
+        Start serving on a background thread and return the base URL.
+        """
+        if not self.port:
+            with socket.socket() as sock:
+                sock.bind((self.host, 0))
+                self.port = sock.getsockname()[1]
+        threading.Thread(target=self._serve, name="fake-maps", daemon=True).start()
+        self._started.wait()
+        return self.base_url
+
+    def _serve(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/maps/api/geocode/json", self._geocode)
+        app.router.add_get("/maps/api/place/nearbysearch/json", self._places_nearby)
+        app.router.add_get("/maps/api/place/details/json", self._place)
+        app.router.add_get("/maps/api/place/photo", self._places_photo)
+
+        async def serve():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, self.port)
+            await site.start()
+            self._started.set()
+            await asyncio.Event().wait()
+
+        asyncio.run(serve())
+
+    async def _wait(self, stage: str):
+        model = self.latencies[stage]
+        latency = model.sample()
+        await asyncio.sleep(latency)
+        failed = model.should_fail()
+        recorder.record(stage, latency, failed=failed)
+        return failed
+
+    @staticmethod
+    def _json(data: Dict[str, Any]):
+        from aiohttp import web
+        return web.json_response(data)
+
+    async def _geocode(self, request):
+        if await self._wait("geocode"):
+            return self._json({"status": "UNKNOWN_ERROR", "results": []})
+        seed = sum(map(ord, request.query.get("address", "").casefold()))
+        return self._json({"status": "OK", "results": [
+            {"geometry": {"location": {"lat": (seed % 180) - 90 + 0.5, "lng": (seed % 360) - 180 + 0.5}}}
+        ]})
+
+    async def _places_nearby(self, request):
+        if await self._wait("places_nearby"):
+            return self._json({"status": "UNKNOWN_ERROR", "results": []})
+        place_type = request.query.get("type", "place")
+        lat, lng = (float(part) for part in request.query["location"].split(","))
+        return self._json({"status": "OK", "results": [
+            {
+                "place_id": f"{place_type}-{lat:.3f}-{lng:.3f}-{i}",
+                "name": f"Fake {place_type} {i}",
+                "rating": 4.0,
+                "vicinity": "1 Fake Street",
+                "geometry": {"location": {"lat": lat + i * 0.001, "lng": lng - i * 0.001}},
+                "photos": [{"photo_reference": f"fakephotoref{place_type}{i:04d}"}]
+            }
+            for i in range(self.results_per_search)
+        ]})
+
+    async def _place(self, request):
+        if await self._wait("place_details"):
+            return self._json({"status": "UNKNOWN_ERROR"})
+        place_id = request.query.get("place_id")
+        return self._json({"status": "OK", "result": {
+            "name": f"Hotel {place_id}",
+            "rating": 4.3,
+            "formatted_address": "1 Fake Street",
+            "price_level": 2,
+            "website": "https://example.com",
+            "formatted_phone_number": "+1 555 0100",
+            "reviews": [{"author_name": "Reviewer", "rating": 5, "text": "Great stay. " * 20}] * 5,
+            "opening_hours": {"weekday_text": [f"Day {d}: Open 24 hours" for d in range(7)]}
+        }})
+
+    async def _places_photo(self, request):
+        from aiohttp import web
+        if await self._wait("places_photo"):
+            return web.Response(status=500)
+        if FakeMapsServer.photo_bytes is None:
+            from PIL import Image
+            buffer = BytesIO()
+            Image.new("RGB", (1600, 1067), (90, 120, 160)).save(buffer, format="JPEG")
+            FakeMapsServer.photo_bytes = buffer.getvalue()
+        return web.Response(body=FakeMapsServer.photo_bytes, content_type="image/jpeg")
+
+
+def configure(profile: Dict[str, Any]):
+    """
+    Apply a benchmark profile to the fakes. See run.py for the profile format.
+    """
+    gemini = profile.get("gemini", {})
+    FakeGenerativeModel.latency = LatencyModel.from_dict(gemini)
+    FakeGenerativeModel.response_chars = gemini.get("response_chars", FakeGenerativeModel.response_chars)
+    FakeGenerativeModel.seconds_per_day = gemini.get("seconds_per_day", FakeGenerativeModel.seconds_per_day)
+    maps = profile.get("maps", {})
+    FakeMapsServer.latencies = {
+        stage: LatencyModel.from_dict(maps[stage]) if stage in maps else model
+        for stage, model in FakeMapsServer.latencies.items()
+    }
+    FakeMapsServer.results_per_search = maps.get("results_per_search", FakeMapsServer.results_per_search)
+
+
+def install() -> str:
+    """
+    Replace the Gemini client with the fake model and start the fake Maps
+    server. Returns the Maps base URL to point the app at. Must run before the
+    app is imported.
+    """
+    import google.generativeai as genai
+    genai.GenerativeModel = FakeGenerativeModel
+    return FakeMapsServer().start()
@@ -0,0 +1,332 @@
+"""
+Offline load test for the trip planning API.
+
+Starts the backend in a subprocess with fake Gemini and Google Maps clients
+(see fakes.py), drives it over HTTP at a fixed concurrency and writes latency
+percentiles, throughput and per-stage upstream timings to a JSON file:
+
+    cd backend
+    python -m benchmarks.run --requests 200 --concurrency 20 --output results.json
+    python -m benchmarks.run --profile slow_gemini.json --compare results.json
+
+A profile is a JSON object; every key is optional and falls back to DEFAULT_PROFILE:
+
+    {
+      "gemini": {"median": 2.0, "p95": 6.0, "error_rate": 0.01, "response_chars": 6000},
+      "maps": {"geocode": {"median": 0.08, "p95": 0.25}, "results_per_search": 20},
+      "config": {"CACHE_ENABLED": false}
+    }
+
+Latencies are in seconds. "config" overrides settings in app/config.py.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiohttp
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "gemini": {"median": 2.0, "p95": 6.0, "error_rate": 0.0, "response_chars": 6000},
+    "maps": {
+        "geocode": {"median": 0.08, "p95": 0.25},
+        "places_nearby": {"median": 0.15, "p95": 0.4},
+        "place_details": {"median": 0.12, "p95": 0.35},
+        "places_photo": {"median": 0.1, "p95": 0.3},
+        "results_per_search": 20
+    },
+    # The harness measures the app, not the production quotas
+    "config": {
+        "RATE_LIMIT_ENABLED": False,
+        "UPSTREAM_QPS": {"gemini": 1000, "google_maps": 1000}
+    }
+}
+
+DESTINATIONS = [
+    "London", "Paris", "Tokyo", "New York", "Rome", "Barcelona", "Dubai",
+    "Singapore", "Sydney", "Bangkok", "Istanbul", "Lisbon", "Prague", "Delhi"
+]
+ORIGINS = ["Bengaluru", "Mumbai", "Berlin", "Toronto"]
+ENDPOINTS = {
+    "plan-trip": "/api/plan-trip",
+    "stream": "/api/plan-trip/stream"
+}
+
+
+def merge_profile(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_profile(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def trip_requests(unique: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    `unique` distinct trip requests; repeats of the same request exercise the caches.
+    """
+    rng = random.Random(seed)
+    interests = ("historical", "nature", "cultural", "shopping", "food", "adventure")
+    return [
+        {
+            "fromLocation": ORIGINS[i % len(ORIGINS)],
+            "destination": DESTINATIONS[i % len(DESTINATIONS)],
+            "travelers": 1 + i // len(DESTINATIONS) % 10,
+            "travelDate": f"2025-{rng.randint(1, 12):02d}",
+            "duration": rng.choice((3, 5, 7, 10)),
+            "interests": {name: rng.random() < 0.5 for name in interests}
+        }
+        for i in range(unique)
+    ]
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None
+    }
+
+
+async def _send(session: aiohttp.ClientSession, url: str, payload: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    first_byte = None
+    status, error = None, None
+    try:
+        async with session.post(url, json=payload) as response:
+            status = response.status
+            if stream:
+                tail = b""
+                async for chunk in response.content.iter_any():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    # Failures after the stream started arrive as an "error" event
+                    if b"event: error" in tail + chunk:
+                        error = "stream_error"
+                    tail = chunk[-16:]
+            else:
+                await response.read()
+                first_byte = time.perf_counter() - started
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = type(e).__name__
+    return {
+        "latency": time.perf_counter() - started,
+        "ttfb": first_byte,
+        "status": status,
+        "error": error
+    }
+
+
+async def drive(base_url: str, endpoint: str, payloads: List[Dict[str, Any]], total: int,
+                concurrency: int, timeout: float) -> Dict[str, Any]:
+    """
+    Send `total` requests from `concurrency` closed-loop workers, cycling through the payloads.
+    """
+    url = base_url + ENDPOINTS[endpoint]
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(payloads[i % len(payloads)])
+    results: List[Dict[str, Any]] = []
+
+    async def worker(session: aiohttp.ClientSession):
+        while not queue.empty():
+            payload = queue.get_nowait()
+            results.append(await _send(session, url, payload, stream=endpoint == "stream"))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return {"results": results, "duration": time.perf_counter() - started}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Benchmark server exited with code {process.returncode}")
+            try:
+                async with session.get(base_url + "/") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Benchmark server did not start in time")
+
+
+async def _bench_call(base_url: str, method: str, path: str) -> Any:
+    async with aiohttp.ClientSession() as session:
+        async with session.request(method, base_url + path) as response:
+            return await response.json()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args: argparse.Namespace, profile: Dict[str, Any], run: Dict[str, Any],
+                 stages: Dict[str, Any]) -> Dict[str, Any]:
+    results = run["results"]
+    ok = [r for r in results if r["status"] == 200 and r["error"] is None]
+    status_codes: Dict[str, int] = {}
+    for r in results:
+        key = r["error"] or str(r["status"])
+        status_codes[key] = status_codes.get(key, 0) + 1
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "endpoint": args.endpoint,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "unique": args.unique or args.requests,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "profile": profile
+        },
+        "summary": {
+            "requests": len(results),
+            "errors": len(results) - len(ok),
+            "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+            "duration": run["duration"],
+            "throughput_rps": len(ok) / run["duration"] if run["duration"] else 0.0,
+            "status_codes": status_codes
+        },
+        "latency": summarize([r["latency"] for r in ok]),
+        "stages": {
+            stage: {**summarize(data["samples"]), "errors": data["errors"]}
+            for stage, data in sorted(stages.items())
+        }
+    }
+    if args.endpoint == "stream":
+        report["ttfb"] = summarize([r["ttfb"] for r in ok if r["ttfb"] is not None])
+    return report
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    summary, latency = report["summary"], report["latency"]
+    print(f"requests: {summary['requests']}  errors: {summary['errors']}  "
+          f"duration: {summary['duration']:.2f}s  throughput: {summary['throughput_rps']:.2f} req/s")
+    rows = [("latency", latency)]
+    if "ttfb" in report:
+        rows.append(("ttfb", report["ttfb"]))
+    rows += [(f"  {stage}", stats) for stage, stats in report["stages"].items()]
+    print(f"{'':<18}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, stats in rows:
+        print(f"{name:<18}{stats['count']:>7}{_fmt(stats['p50']):>9}{_fmt(stats['p95']):>9}"
+              f"{_fmt(stats['p99']):>9}{_fmt(stats['max']):>9}")
+
+    if baseline:
+        print(f"\nvs {baseline['meta'].get('git_commit') or 'baseline'}:")
+        for key in ("p50", "p95", "p99"):
+            old, new = baseline["latency"][key], latency[key]
+            if old and new:
+                print(f"  {key}: {_fmt(old)} -> {_fmt(new)} ({(new - old) / old:+.1%})")
+        old, new = baseline["summary"]["throughput_rps"], summary["throughput_rps"]
+        if old:
+            print(f"  throughput: {old:.2f} -> {new:.2f} req/s ({(new - old) / old:+.1%})")
+
+
+async def run_benchmark(args: argparse.Namespace, profile: Dict[str, Any]) -> Dict[str, Any]:
+    port = args.port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(profile, f)
+        profile_path = f.name
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.server", "--profile", profile_path, "--port", str(port)],
+        cwd=BACKEND_DIR
+    )
+    try:
+        await _wait_ready(base_url, process)
+        payloads = trip_requests(args.unique or args.requests, args.seed)
+        if args.warmup:
+            await drive(base_url, args.endpoint, payloads, args.warmup, args.concurrency, args.timeout)
+        await _bench_call(base_url, "POST", "/_bench/reset")
+        run = await drive(base_url, args.endpoint, payloads, args.requests, args.concurrency, args.timeout)
+        stages = await _bench_call(base_url, "GET", "/_bench/stages")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        os.unlink(profile_path)
+    return build_report(args, profile, run, stages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", help="Profile JSON file merged over DEFAULT_PROFILE")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="plan-trip")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--unique", type=int, help="Distinct trip requests (default: all distinct)")
+    parser.add_argument("--warmup", type=int, default=0, help="Unmeasured requests sent first")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, help="Server port (default: any free port)")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile) as f:
+            profile = merge_profile(DEFAULT_PROFILE, json.load(f))
+
+    report = asyncio.run(run_benchmark(args, profile))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Run the backend with fake upstream clients. Started by run.py in its own process:
+
+    python -m benchmarks.server --profile profile.json --port 8765
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import uvicorn
+from benchmarks import fakes
+
+
+def create_app(profile: dict):
+    """
+    Install the fakes, apply the profile's config overrides and import the app.
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GOOGLE_MAPS_API_KEY", "benchmark")
+    fakes.configure(profile)
+    maps_base_url = fakes.install()
+
+    from app import config
+    config.GOOGLE_MAPS_BASE_URL = maps_base_url
+    # Keep benchmark caches out of the real cache directory
+    cache_dir = tempfile.mkdtemp(prefix="trip-planner-bench-")
+    config.CACHE_DIR = config.Path(cache_dir)
+    config.PHOTO_CACHE_DIR = config.CACHE_DIR / "photos"
+    config.JOBS_DB = config.CACHE_DIR / "jobs.sqlite3"
+    for name, value in profile.get("config", {}).items():
+        if not hasattr(config, name):
+            raise ValueError(f"Unknown config setting in profile: {name}")
+        setattr(config, name, value)
+
+    from app.main import app
+
+    @app.get("/_bench/stages", include_in_schema=False)
+    async def bench_stages():
+        return fakes.recorder.snapshot()
+
+    @app.post("/_bench/reset", include_in_schema=False)
+    async def bench_reset():
+        fakes.recorder.reset()
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", required=True, help="Benchmark profile JSON file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with open(args.profile) as f:
+        profile = json.load(f)
+    app = create_app(profile)
+    logging.getLogger().setLevel(profile.get("log_level", "WARNING"))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib3.util.retry import Retry
+
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# (connect, read) timeouts in seconds
+PHOTO_TIMEOUT = (3, 10)
+JOB_TIMEOUT = (3, 10)
+# How long to wait for a submitted trip plan before giving up
+JOB_DEADLINE = 300  # seconds
+# Progress fields of a job and the result events they correspond to
+JOB_DETAIL_EVENTS = {
+    "flightsInfo": "flights",
+    "map_data": "coordinates",
+    "accommodations": "accommodations",
+    "photos": "photos"
+}
+
+
+def _create_session() -> requests.Session:
+    """
+    Keep-alive session shared by every script run in this process. Sized for
+    the photo gallery's parallel downloads; only idempotent requests are
+    retried, and only when the connection could not be made.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2, allowed_methods={"GET"})
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _create_session()
+
+
+def submit_trip_job(form_data: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+    """
+    Queue a trip plan on the backend and return the job. The idempotency key
+    makes the submission safe to retry: the backend returns the same job.
+    """
+    for attempt in range(3):
+        try:
+            response = session.post(
+                f"{BACKEND_URL}/api/jobs",
+                json=form_data,
+                headers={"Idempotency-Key": idempotency_key},
+                timeout=JOB_TIMEOUT
+            )
+        except requests.ConnectionError:
+            if attempt == 2:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+            continue
+        if response.status_code not in (200, 202):
+            raise RuntimeError(f"Error: {response.status_code} - {response.text}")
+        return response.json()
+
+
+def poll_trip_job(job_id: str, deadline: float = JOB_DEADLINE) -> Iterator[Tuple[str, Any]]:
+    """
+    Poll a trip plan job until it finishes, yielding (event, data) pairs for
+    whatever progress is new since the last poll: "section" chunks of the plan
+    text, then "flights", "coordinates", "accommodations" and "photos" as each
+    arrives, and finally "tripPlan" and "result" with the whole plan.
+    """
+    seen_sections: Dict[str, int] = {}
+    seen_details = set()
+    give_up_at = time.monotonic() + deadline
+    while True:
+        response = session.get(f"{BACKEND_URL}/api/jobs/{job_id}", timeout=JOB_TIMEOUT)
+        if response.status_code == 429:
+            # Rate limited: wait as long as the backend asks, within the deadline
+            if time.monotonic() > give_up_at:
+                raise RuntimeError("Timed out waiting for the trip plan")
+            retry_after = float(response.headers.get("Retry-After", 5))
+            time.sleep(max(0.5, min(retry_after, give_up_at - time.monotonic())))
+            continue
+        if response.status_code != 200:
+            raise RuntimeError(f"Error: {response.status_code} - {response.text}")
+        job = response.json()
+        progress = job.get("progress") or {}
+
+        for name, text in progress.get("sections", {}).items():
+            if len(text) > seen_sections.get(name, 0):
+                yield "section", {"section": name, "text": text[seen_sections.get(name, 0):]}
+                seen_sections[name] = len(text)
+        details = job.get("result") or progress
+        for field, event in JOB_DETAIL_EVENTS.items():
+            if field in details and field not in seen_details:
+                seen_details.add(field)
+                yield event, details[field]
+
+        if job["status"] == "succeeded":
+            yield "tripPlan", job["result"]["tripPlan"]
+            # The whole plan, for callers that keep it
+            yield "result", job["result"]
+            return
+        if job["status"] == "failed":
+            raise RuntimeError(job.get("error") or "Trip planning failed")
+        if time.monotonic() > give_up_at:
+            raise RuntimeError("Timed out waiting for the trip plan")
+        time.sleep(min(max(float(response.headers.get("Retry-After", 1)), 0.5), 2.0))
+
+
+def fetch_photo(url: str, width: int = 640) -> Optional[bytes]:
+    """
+    Download a photo thumbnail from the backend photo proxy. Returns None if unavailable.
+    """
+    if url.startswith("/"):
+        url = f"{BACKEND_URL}{url}"
+    try:
+        response = session.get(
+            url,
+            params={"w": width},
+            headers={"Accept": "image/webp,image/jpeg"},
+            timeout=PHOTO_TIMEOUT
+        )
+    except requests.RequestException:
+        return None
+    return response.content if response.status_code == 200 else None
@@ -1,6 +1,9 @@
-import os
+import hashlib
+import uuid
 import streamlit as st
-import requests
+from api_client import submit_trip_job, poll_trip_job
+from result_cache import form_key, get_plan, remember_plan
+from static_assets import get_stylesheet
 from components.header import render_header
 from components.form import render_trip_form
 from components.results import TripResults
@@ -12,11 +15,10 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Load custom CSS
-css_path = os.path.join(os.path.dirname(__file__), "assets", "styles", "style.css")
-if os.path.exists(css_path):
-    with open(css_path) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+# Load custom CSS (read and built once per process, not on every rerun)
+stylesheet = get_stylesheet()
+if stylesheet.strip():
+    st.markdown(f"<style>{stylesheet}</style>", unsafe_allow_html=True)
 else:
     st.warning("Custom CSS file not found. Using default Streamlit styles.")
 
@@ -33,21 +35,34 @@ def main():
             st.error("Please enter both departure and destination locations.")
             return
 
+        key = form_key(form_data)
+        cached = get_plan(key)
+        if cached is not None:
+            TripResults(cached).render()
+            return
+
+        # Resubmitting the same form in this session attaches to the same backend job
+        client_id = st.session_state.setdefault("client_id", uuid.uuid4().hex)
+        idempotency_key = hashlib.sha256(f"{client_id}:{key}".encode()).hexdigest()
+
         with st.spinner("Planning your trip..."):
             try:
-                response = requests.post(
-                    "http://localhost:8000/api/plan-trip",
-                    json=form_data,
-                    headers={"Content-Type": "application/json"}
-                )
-                if response.status_code == 200:
-                    response_data = response.json()
-                    trip_results = TripResults(response_data)
-                    trip_results.render()
-                else:
-                    st.error(f"Error: {response.status_code} - {response.text}")
+                job = submit_trip_job(form_data, idempotency_key)
+                # Sections are rendered as the job reports progress
+                trip_results = TripResults({})
+                trip_results.render_stream(poll_trip_job(job["job_id"]))
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
+                return
+        if trip_results.complete:
+            # Plans without a section status are kept for this session only
+            status = trip_results.data.get("sectionStatus") or {}
+            complete = bool(status) and all(s == "ok" for s in status.values())
+            remember_plan(key, trip_results.data, complete=complete)
+
+    # 4) Any other rerun (a widget interaction) re-renders the last plan without calling the backend
+    elif "trip_result" in st.session_state:
+        TripResults(st.session_state["trip_result"]["data"]).render()
 
 if __name__ == "__main__":
     main()
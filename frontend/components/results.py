@@ -1,10 +1,10 @@
 import streamlit as st
 import logging
-import pandas as pd
-import requests
-from io import BytesIO
-from PIL import Image
 import os
+import pandas as pd
+from api_client import fetch_photo
+from result_cache import forget_plan, get_photos
+from static_assets import get_manifest, static_path
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,8 @@ class TripResults:
         self.hotels = response_data.get("accommodations", {})
         self.map_data = response_data.get("map_data", {})
         self.photos = response_data.get("photos", [])
+        # Set by render_stream once the complete plan has arrived without errors
+        self.complete = False
 
     def render(self):
         # Render tabs for Overview, Itinerary, Practical Info, Travel Details
@@ -29,6 +31,69 @@ class TripResults:
         with tab4:
             self._render_travel_details_tab()
 
+        self._render_actions()
+
+    def render_stream(self, events):
+        """
+        Render the results progressively from (event, data) pairs produced by
+        the streaming plan-trip endpoint, updating each section as it arrives.
+        """
+        tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Itinerary", "Practical Info", "Travel Details"])
+        with tab1:
+            st.markdown("<div class='section-header'>Overview</div>", unsafe_allow_html=True)
+            overview_slot, gallery_slot, map_slot = st.empty(), st.empty(), st.empty()
+        with tab2:
+            st.markdown("<div class='section-header'>Itinerary</div>", unsafe_allow_html=True)
+            itinerary_slot = st.empty()
+        with tab3:
+            st.markdown("<div class='section-header'>Practical Info</div>", unsafe_allow_html=True)
+            practical_info_slot = st.empty()
+        with tab4:
+            flights_slot, hotels_slot = st.empty(), st.empty()
+
+        section_slots = {
+            "overview": (overview_slot, self._render_overview_text),
+            "itinerary": (itinerary_slot, self._render_itinerary),
+            "practicalInfo": (practical_info_slot, self._render_practical_info)
+        }
+        for event, data in events:
+            if event == "section":
+                name = data.get("section")
+                self.trip_plan[name] = self.trip_plan.get(name, "") + data.get("text", "")
+                slot, render_section = section_slots[name]
+                with slot.container():
+                    render_section()
+            elif event == "tripPlan":
+                self.trip_plan = data
+                for slot, render_section in section_slots.values():
+                    with slot.container():
+                        render_section()
+            elif event == "coordinates":
+                self.map_data = data
+                with map_slot.container():
+                    self._render_map()
+            elif event == "photos":
+                self.photos = data
+                with gallery_slot.container():
+                    self._render_gallery()
+            elif event == "flights":
+                self.flights = data
+                with flights_slot.container():
+                    self._render_flights()
+            elif event == "accommodations":
+                self.hotels = data
+                with hotels_slot.container():
+                    self._render_hotels()
+            elif event == "result":
+                self.data = data
+                self.complete = True
+            elif event == "error":
+                self.complete = False
+                st.error(f"An error occurred: {data.get('detail', 'unknown error')}")
+
+        self._render_actions()
+
+    def _render_actions(self):
         st.divider()
 
         # Single column at the bottom left: "Generate Another Trip" button
@@ -39,16 +104,23 @@ class TripResults:
                 for key in ["form_data", "pdf_bytes"]:
                     if key in st.session_state:
                         del st.session_state[key]
+                forget_plan()
                 st.experimental_rerun()
 
     def _render_overview_tab(self):
         st.markdown("<div class='section-header'>Overview</div>", unsafe_allow_html=True)
+        self._render_overview_text()
+        self._render_gallery()
+        self._render_map()
+
+    def _render_overview_text(self):
         overview = self.trip_plan.get("overview", "")
         if overview:
             st.markdown(overview, unsafe_allow_html=True)
         else:
             st.info("No overview available.")
-        self._render_gallery()
+
+    def _render_map(self):
         if self.map_data:
             try:
                 lat = self.map_data.get("latitude", [])[0]
@@ -62,20 +134,33 @@ class TripResults:
 
     def _render_itinerary_tab(self):
         st.markdown("<div class='section-header'>Itinerary</div>", unsafe_allow_html=True)
+        self._render_itinerary()
+
+    def _render_itinerary(self):
+        # Days arrive pre-parsed from the backend; while a plan is still
+        # streaming only the raw itinerary text is available.
+        days = self.trip_plan.get("days", [])
         itinerary_text = self.trip_plan.get("itinerary", "")
-        if not itinerary_text:
-            st.info("No itinerary available.")
+        if not days:
+            if itinerary_text:
+                st.markdown(itinerary_text, unsafe_allow_html=True)
+            else:
+                st.info("No itinerary available.")
             return
-        days = itinerary_text.split("Day ")
-        for i, day_content in enumerate(days):
-            if i == 0 or not day_content.strip():
-                continue
-            day_number = day_content.split(":")[0]
-            with st.expander(f"Day {day_number.strip()}", expanded=False):
-                st.markdown(f"**Day {day_number.strip()}:** " + day_content[len(day_number):], unsafe_allow_html=True)
+        for day in days:
+            title = f"Day {day['day']}: {day['title']}" if day.get("title") else f"Day {day['day']}"
+            with st.expander(title, expanded=False):
+                for slot in ("morning", "afternoon", "evening"):
+                    if day.get(slot):
+                        st.markdown(f"**{slot.capitalize()}:** {day[slot]}", unsafe_allow_html=True)
+                if day.get("notes"):
+                    st.markdown(day["notes"], unsafe_allow_html=True)
 
     def _render_practical_info_tab(self):
         st.markdown("<div class='section-header'>Practical Info</div>", unsafe_allow_html=True)
+        self._render_practical_info()
+
+    def _render_practical_info(self):
         practical_info = self.trip_plan.get("practicalInfo", "")
         if practical_info:
             st.markdown(practical_info, unsafe_allow_html=True)
@@ -83,6 +168,10 @@ class TripResults:
             st.info("No practical info available.")
 
     def _render_travel_details_tab(self):
+        self._render_flights()
+        self._render_hotels()
+
+    def _render_flights(self):
         st.markdown("<div class='section-header'>Flight Options</div>", unsafe_allow_html=True)
         flight_list = self.flights.get("available_flights", [])
         if flight_list:
@@ -98,6 +187,7 @@ class TripResults:
         else:
             st.info("No flight information available.")
 
+    def _render_hotels(self):
         st.markdown("<div class='section-header'>Accommodation Options</div>", unsafe_allow_html=True)
         hotel_list = self.hotels.get("hotels", [])
         if hotel_list:
@@ -111,6 +201,8 @@ class TripResults:
                     st.write(f"**Phone:** {hotel['phone']}")
                 if hotel.get('website'):
                     st.write(f"**Website:** [{hotel['website']}]({hotel['website']})")
+                if hotel.get('partial'):
+                    st.caption("Full details for this hotel were not available in time.")
                 st.write("---")
         else:
             st.info("No hotel information available.")
@@ -119,25 +211,22 @@ class TripResults:
         if not self.photos:
             return
         st.markdown("##### Destination Gallery")
+        # Thumbnails already shown to this or another session are reused; the rest are fetched in parallel
+        images = get_photos(self.photos, fetch_photo)
         cols = st.columns(3)
-        for i, photo_url in enumerate(self.photos):
+        for i, image in enumerate(images):
             with cols[i % 3]:
-                self._display_photo(photo_url)
-
-    def _display_photo(self, url: str):
-        try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
-                img = Image.open(BytesIO(resp.content))
-                st.image(img, use_column_width=True)
-            else:
-                self._show_fallback()
-        except Exception:
+                self._display_photo(image)
+
+    def _display_photo(self, image):
+        if image:
+            st.image(image, use_column_width=True)
+        else:
             self._show_fallback()
 
     def _show_fallback(self):
-        fallback_path = "./assets/images/fallback-image.jpg"
-        if os.path.exists(fallback_path):
-            st.image(fallback_path, use_column_width=True, caption="Photo Unavailable")
+        fallback_url = get_manifest().get("fallback-image-640")
+        if fallback_url and os.path.exists(static_path(fallback_url)):
+            st.image(static_path(fallback_url), use_column_width=True, caption="Photo Unavailable")
         else:
             st.warning("Photo unavailable (no fallback image found).")
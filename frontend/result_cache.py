@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import streamlit as st
+
+# Trip plans are shared by every session asking for the same trip
+PLAN_CACHE_TTL = 30 * 60  # seconds
+PLAN_CACHE_MAX_ENTRIES = 128
+# Photo thumbnails, bounded by their total size
+PHOTO_CACHE_TTL = 60 * 60  # seconds
+PHOTO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PHOTO_FETCH_WORKERS = 6
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL, bounded by entry
+    count and optionally by the total length of its (bytes) values. Streamlit
+    runs each session's script on its own thread, so one instance is shared
+    between them.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += self._size(value)
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: Any):
+        _, value = self._data.pop(key)
+        self._bytes -= self._size(value)
+
+    def _size(self, value: Any) -> int:
+        return len(value) if self.max_bytes is not None else 0
+
+
+@st.cache_resource
+def get_plan_cache() -> BoundedCache:
+    return BoundedCache(PLAN_CACHE_TTL, PLAN_CACHE_MAX_ENTRIES)
+
+
+@st.cache_resource
+def get_photo_cache() -> BoundedCache:
+    # Entry count is only a backstop; the byte limit is what normally applies
+    return BoundedCache(PHOTO_CACHE_TTL, 10000, max_bytes=PHOTO_CACHE_MAX_BYTES)
+
+
+def _normalize_text(value: Any) -> str:
+    return " ".join(str(value).casefold().split())
+
+
+def form_key(form_data: Dict[str, Any]) -> str:
+    """
+    Canonical form of the submitted form data, identical for equivalent trips.
+    Normalized like the backend's TripRequest.canonical_key, so forms that
+    differ only in case or whitespace share a cached plan.
+    """
+    interests = sorted(
+        _normalize_text(name) for name, selected in (form_data.get("interests") or {}).items() if selected
+    )
+    return "|".join([
+        _normalize_text(form_data.get("fromLocation", "")),
+        _normalize_text(form_data.get("destination", "")),
+        str(form_data.get("travelDate", "")).strip(),
+        str(form_data.get("duration") or 7),
+        str(form_data.get("travelers", "")),
+        ",".join(interests)
+    ])
+
+
+def get_plan(key: str) -> Optional[Dict[str, Any]]:
+    """
+    The complete trip plan for a form key, from this session's last plan or
+    the process-wide cache. Plans are shared between sessions; don't modify them.
+    """
+    last = st.session_state.get("trip_result")
+    if last is not None and last["key"] == key and last["complete"]:
+        return last["data"]
+    if last is None or last["key"] != key:
+        # A different trip: the previous trip's photos are no longer shown
+        st.session_state["photos"] = {}
+    data = get_plan_cache().get(key)
+    if data is not None:
+        _remember_in_session(key, data, complete=True)
+    return data
+
+
+def remember_plan(key: str, data: Dict[str, Any], complete: bool = True):
+    """
+    Keep a plan for this session's reruns and, if it is `complete`, for
+    resubmissions and other sessions too. A plan with sections missing is
+    fetched again when its form is submitted again.
+    """
+    _remember_in_session(key, data, complete)
+    if complete:
+        get_plan_cache().set(key, data)
+
+
+def _remember_in_session(key: str, data: Dict[str, Any], complete: bool):
+    st.session_state["trip_result"] = {"key": key, "data": data, "complete": complete}
+
+
+def forget_plan():
+    for name in ("trip_result", "photos"):
+        st.session_state.pop(name, None)
+
+
+def get_photos(urls: List[str], fetch: Callable[[str], Optional[bytes]]) -> List[Optional[bytes]]:
+    """
+    Photo bytes for each URL, from this session, then the process-wide cache,
+    fetching only the ones neither holds, in parallel. Failed fetches are
+    returned as None and retried on a later run.
+    """
+    session_photos = st.session_state.setdefault("photos", {})
+    photo_cache = get_photo_cache()
+    images: Dict[str, Optional[bytes]] = {}
+    for url in urls:
+        image = session_photos.get(url)
+        if image is None:
+            image = photo_cache.get(url)
+        images[url] = image
+
+    missing = [url for url, image in images.items() if image is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=PHOTO_FETCH_WORKERS) as pool:
+            for url, image in zip(missing, pool.map(fetch, missing)):
+                images[url] = image
+                if image is not None:
+                    photo_cache.set(url, image)
+    for url, image in images.items():
+        if image is not None:
+            session_photos[url] = image
+    return [images[url] for url in urls]
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from io import BytesIO
+from typing import Dict
+import streamlit as st
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(BASE_DIR, "assets", "images")
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+MANIFEST_PATH = os.path.join(STATIC_DIR, "manifest.json")
+# Streamlit serves the static/ folder under this URL path
+STATIC_URL = "app/static"
+
+# Images from assets/images are downscaled once into static/ under content-hashed
+# names and served by URL. Run `python static_assets.py` at build time, otherwise
+# they are built on first start.
+# (source image, output name, widths)
+IMAGE_VARIANTS = [
+    ("header-bg.jpg", "header-bg", (960, 1920)),
+    ("fallback-image.jpg", "fallback-image", (640,)),
+]
+
+
+def _variant(source_path: str, width: int) -> bytes:
+    with Image.open(source_path) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format="WEBP", quality=75, method=6)
+        return buffer.getvalue()
+
+
+def build_assets(force: bool = False) -> Dict[str, str]:
+    """
+    Build every image variant that is missing or out of date and return the
+    manifest mapping "<name>-<width>" to its URL.
+    """
+    manifest = {}
+    if not force and os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    changed = False
+    for source, name, widths in IMAGE_VARIANTS:
+        source_path = os.path.join(IMAGES_DIR, source)
+        if not os.path.exists(source_path):
+            continue
+        with open(source_path, "rb") as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()[:12]
+        for width in widths:
+            key = f"{name}-{width}"
+            filename = f"{name}-{width}.{source_hash}.webp"
+            # The ?v= argument makes Streamlit's static handler send a long-lived Cache-Control
+            url = f"{STATIC_URL}/{filename}?v={source_hash}"
+            if manifest.get(key) == url and os.path.exists(os.path.join(STATIC_DIR, filename)):
+                continue
+            with open(os.path.join(STATIC_DIR, filename), "wb") as f:
+                f.write(_variant(source_path, width))
+            manifest[key] = url
+            changed = True
+
+    if changed:
+        with open(MANIFEST_PATH, "w") as f:
+            json.dump(manifest, f, indent=2)
+    return manifest
+
+
+@st.cache_resource
+def get_manifest() -> Dict[str, str]:
+    """
+    Build the assets once per process and return their manifest.
+    """
+    return build_assets()
+
+
+def static_path(url: str) -> str:
+    """
+    The local file behind a manifest URL. st.image needs this: it only takes
+    URLs with a scheme, so the relative static URLs are for HTML and CSS only.
+    """
+    filename = url.split("?", 1)[0].rsplit("/", 1)[-1]
+    return os.path.join(STATIC_DIR, filename)
+
+
+@st.cache_resource
+def get_stylesheet() -> str:
+    """
+    The app stylesheet plus asset rules, read once per process.
+    """
+    css_path = os.path.join(BASE_DIR, "assets", "styles", "style.css")
+    css = ""
+    if os.path.exists(css_path):
+        with open(css_path) as f:
+            css = f.read()
+    return css + "\n" + asset_css(get_manifest())
+
+
+def asset_css(manifest: Dict[str, str]) -> str:
+    """
+    CSS rules that reference the built assets by URL.
+    """
+    if "header-bg-1920" not in manifest:
+        return ""
+    return (
+        f".hero-container {{ background: url('{manifest['header-bg-1920']}') center center / cover no-repeat; }}\n"
+        f"@media (max-width: 960px) {{ .hero-container {{ background-image: url('{manifest['header-bg-960']}'); }} }}\n"
+    )
+
+
+if __name__ == "__main__":
+    for key, url in build_assets(force=True).items():
+        print(f"{key}: {url}")